@@ -0,0 +1,44 @@
+#!/bin/bash
+#SBATCH --partition=gpuq
+#SBATCH --gres=gpu:A100:1
+#SBATCH --mem=64G
+#SBATCH --time=16:00:00
+#SBATCH --job-name=AF3Pulldown
+#SBATCH --output=/dev/null
+#SBATCH --error=/dev/null
+
+# === Input arguments ===
+SCREEN_DIR="$1"  # e.g. pulldown (made by pulldown.py)
+OUTPUT_DIR="$2"  # e.g. AF3Outputs_pulldown
+TASK_DIR="${SCREEN_DIR}/task_${SLURM_ARRAY_TASK_ID}"
+
+if [[ -z "$SCREEN_DIR" || -z "$OUTPUT_DIR" ]]; then
+    echo "❌ Error: Missing input arguments."
+    echo "Usage: sbatch --array=0-<shards - 1> af3array.sh <screen_dir> <output_dir>"
+    echo "Example: sbatch --array=0-39 af3array.sh pulldown AF3Outputs_pulldown"
+    exit 1
+fi
+
+# === Check this task's directory exists ===
+if [[ ! -d "$TASK_DIR" ]]; then
+    echo "❌ Error: Task directory '$TASK_DIR' not found."
+    exit 1
+fi
+
+# === Prepare output directory ===
+mkdir -p "$OUTPUT_DIR"
+
+# === Load modules ===
+module purge
+module load apptainer/1.4.1
+module load alphafold/3.0.0
+
+# === Run AlphaFold3 on every job in this task ===
+for JSON_FILE in "$TASK_DIR"/*.json; do
+    echo "Running AlphaFold3 on $JSON_FILE ..."
+    alphafold3 -o "$OUTPUT_DIR" -i "$JSON_FILE"
+done
+
+# === Record this task's predictions and their MSAs (see af3index.py and af3msa.py) ===
+python af3index.py add "$OUTPUT_DIR" --inputs "$TASK_DIR"/*.json
+python af3msa.py add "$OUTPUT_DIR" --inputs "$TASK_DIR"/*.json
@@ -0,0 +1,176 @@
+"""
+Content-addressed index of finished AlphaFold3 predictions.
+
+A job's hash only depends on what is being predicted: each distinct protein,
+DNA, RNA or ligand with its modifications and number of copies, plus the
+bonded atom pairs. Chain IDs, record order, file names and model seeds don't
+change it, so the same complex is recognised however its FASTA was written.
+
+The index is a CSV of hash, job name and output folder, by default
+~/af3_index.csv (set AF3_INDEX to use another file). af3predict.sh adds each
+prediction when it finishes; older results can be added by hand:
+
+    python af3index.py add /path/to/AF3Outputs
+    python af3index.py lookup job1.json job2.json
+
+With --inputs only the job folders made for those input JSONs are read, which
+is how the batch scripts add just their own jobs to a shared output folder.
+"""
+import os
+import re
+import csv
+import sys
+import json
+import random
+import hashlib
+import argparse
+from collections import Counter
+
+INDEX_COLUMNS = ["hash", "job", "output"]
+DEFAULT_INDEX = os.environ.get("AF3_INDEX", os.path.expanduser("~/af3_index.csv"))
+
+# Fields that describe what an entity is, as opposed to its chain IDs or MSAs/templates
+_CONTENT_FIELDS = ("sequence", "modifications", "ccdCodes", "smiles")
+
+def _sha256(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+def entity_key(entity):
+    """Hash of one sequences entry, ignoring its chain IDs."""
+    (kind, body), = entity.items()
+    content = {field: body[field] for field in _CONTENT_FIELDS if field in body}
+    if "modifications" in content:
+        content["modifications"] = sorted(content["modifications"], key=_sha256)
+    return _sha256([kind, content])
+
+class ContentHasher:
+    """Builds a job's hash from its sequences entries, fed one at a time."""
+    def __init__(self):
+        self.copies = Counter()
+        self.chain_keys = {}
+        self.bonded_atom_pairs = []
+
+    def add(self, entity, bonded_atom_pairs=()):
+        key = entity_key(entity)
+        ids = next(iter(entity.values()))["id"]
+        ids = [ids] if isinstance(ids, str) else ids
+        self.copies[key] += len(ids)
+        for chain in ids:
+            self.chain_keys[chain] = key
+        self.bonded_atom_pairs.extend(bonded_atom_pairs)
+
+    def hexdigest(self):
+        # Bonds point at chains, swap those for the entity so chain naming doesn't matter
+        bonds = sorted(sorted([self.chain_keys.get(chain, chain), position, atom] for chain, position, atom in pair)
+                       for pair in self.bonded_atom_pairs)
+        return _sha256({"entities": sorted(self.copies.items()), "bonds": bonds})
+
+def content_hash(data):
+    """Hash of an AlphaFold3 input (or *_data.json output) already loaded as a dict."""
+    hasher = ContentHasher()
+    for entity in data["sequences"]:
+        hasher.add(entity)
+    hasher.bonded_atom_pairs.extend(data.get("bondedAtomPairs") or [])
+    return hasher.hexdigest()
+
+def hash_seeds(digest, count=7):
+    """Model seeds derived from a job hash, so the same complex always gets the same seeds."""
+    rng = random.Random(int(digest[:16], 16))
+    return [rng.randint(1, 100000) for _ in range(count)]
+
+def load_index(path=DEFAULT_INDEX):
+    """Return {hash: output folder} for every prediction in the index, {} if there is none yet."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="") as f:
+        return {row["hash"]: row["output"] for row in csv.DictReader(f)}
+
+def add_to_index(rows, path=DEFAULT_INDEX):
+    """Append {hash, job, output} rows to the index, locked so array tasks can add at the same time."""
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    with open(path, "a", newline="") as f:
+        if fcntl is not None:
+            # Released when the file is closed, after the rows are flushed
+            fcntl.flock(f, fcntl.LOCK_EX)
+        writer = csv.DictWriter(f, fieldnames=INDEX_COLUMNS)
+        if f.seek(0, os.SEEK_END) == 0:
+            writer.writeheader()
+        writer.writerows(rows)
+
+def sanitised_name(name):
+    """The name AlphaFold3 gives a job's output files, e.g. 'Heavy Light' -> 'heavy_light'."""
+    return re.sub(r"[^a-z0-9_.-]", "", name.lower().replace(" ", "_"))
+
+def job_folders(output_dir, json_files):
+    """The folders AlphaFold3 wrote under output_dir for these input JSONs, skipping jobs it didn't run."""
+    if not os.path.isdir(output_dir):
+        return []
+    entries = sorted(os.listdir(output_dir))
+    folders = []
+    for json_file in json_files:
+        with open(json_file) as f:
+            name = sanitised_name(json.load(f)["name"])
+        # A rerun into a folder that isn't empty goes to <name>_<date>_<time>, take the newest
+        runs = [entry for entry in entries if re.fullmatch(re.escape(name) + r"(_\d{8}_\d{6})?", entry)]
+        if runs:
+            folders.append(os.path.join(output_dir, runs[-1]))
+    return folders
+
+def prediction_paths(outputs, json_files=None):
+    """What to read for the add commands: the outputs, or only the job folders of json_files in them."""
+    if not json_files:
+        return outputs
+    return [folder for output in outputs for folder in job_folders(output, json_files)]
+
+def find_predictions(paths):
+    """Yield every *_data.json that AlphaFold3 wrote under the given folders."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.endswith("_data.json"):
+                    yield os.path.join(root, name)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep track of which complexes AlphaFold3 has already predicted.")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help=f"index file (default {DEFAULT_INDEX})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="record the predictions in AlphaFold3 output folders")
+    add.add_argument("outputs", nargs="+")
+    add.add_argument("--inputs", nargs="+", help="only read the job folders of these input JSONs")
+    lookup = commands.add_parser("lookup", help="check whether input JSONs were already predicted")
+    lookup.add_argument("json_files", nargs="+")
+    args = parser.parse_args(argv)
+
+    index = load_index(args.index)
+    if args.command == "add":
+        rows = []
+        for data_file in find_predictions(prediction_paths(args.outputs, args.inputs)):
+            with open(data_file) as f:
+                data = json.load(f)
+            output = os.path.dirname(os.path.abspath(data_file))
+            digest = content_hash(data)
+            if index.get(digest) != output:
+                rows.append({"hash": digest, "job": data["name"], "output": output})
+                index[digest] = output
+        add_to_index(rows, args.index)
+        print(f"{len(rows)} predictions added to {args.index}")
+        return
+
+    for json_file in args.json_files:
+        try:
+            with open(json_file) as f:
+                digest = content_hash(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: could not read {json_file}: {e}")
+            sys.exit(1)
+        found = index.get(digest)
+        print(f"{json_file}: {digest[:12]} " + (f"already predicted in {found}" if found else "not predicted yet"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Local cache of AlphaFold3 MSAs and templates, so each chain is searched once.
+
+The MSA and template search only depends on a chain's sequence, so the
+results AlphaFold3 writes into <job>_data.json are stored per sequence, one
+JSON file per protein or RNA chain in the cache folder (~/af3_msa_cache by
+default, set AF3_MSA_CACHE to use another). When fasta2json.py or pulldown.py
+is run with --msa-cache, chains found in the cache get their unpairedMsa,
+pairedMsa and templates filled in, and AlphaFold3 skips the data pipeline for
+them. af3predict.sh adds each prediction's MSAs when it finishes; older
+results can be added by hand:
+
+    python af3msa.py add /path/to/AF3Outputs
+
+As with af3index.py, --inputs limits this to the job folders of those input JSONs.
+"""
+import os
+import json
+import hashlib
+import argparse
+import tempfile
+from functools import lru_cache
+
+from af3index import find_predictions, prediction_paths
+
+DEFAULT_MSA_CACHE = os.environ.get("AF3_MSA_CACHE", os.path.expanduser("~/af3_msa_cache"))
+
+# What AlphaFold3 fills in for each kind of chain, all of which must be given together
+MSA_FIELDS = {
+    "protein": ("unpairedMsa", "pairedMsa", "templates"),
+    "rna": ("unpairedMsa",),
+}
+
+def sequence_key(kind, sequence):
+    """Cache key of one chain, from its type and sequence only."""
+    return hashlib.sha256(f"{kind}:{sequence.upper()}".encode()).hexdigest()
+
+@lru_cache(maxsize=16)
+def _read(path, mtime):
+    # Keyed on mtime too so an entry rewritten by `add` is read again
+    with open(path) as f:
+        return json.load(f)
+
+class MsaCache:
+    """Looks up and stores the MSA fields of sequences entries in a cache folder."""
+    def __init__(self, directory=DEFAULT_MSA_CACHE):
+        self.directory = directory
+        self.hits = 0
+
+    def path(self, kind, sequence):
+        return os.path.join(self.directory, sequence_key(kind, sequence) + ".json")
+
+    def fill(self, entity):
+        """Add the cached MSA fields to a sequences entry in place, returning whether it was cached."""
+        (kind, body), = entity.items()
+        if kind not in MSA_FIELDS or any(field in body for field in MSA_FIELDS[kind]):
+            return False
+        path = self.path(kind, body["sequence"])
+        if not os.path.exists(path):
+            return False
+        body.update(_read(path, os.path.getmtime(path)))
+        self.hits += 1
+        return True
+
+    def store(self, entity):
+        """Save a sequences entry's MSA fields (from an AlphaFold3 output), returning whether it was new."""
+        (kind, body), = entity.items()
+        if kind not in MSA_FIELDS or any(body.get(field) is None for field in MSA_FIELDS[kind]):
+            return False
+        path = self.path(kind, body["sequence"])
+        if os.path.exists(path):
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        # Written under a temporary name first, array tasks may be adding the same chain
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({field: body[field] for field in MSA_FIELDS[kind]}, f)
+        os.replace(temp, path)
+        return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep the MSAs and templates of finished AlphaFold3 predictions for reuse.")
+    parser.add_argument("--cache", default=DEFAULT_MSA_CACHE, help=f"cache folder (default {DEFAULT_MSA_CACHE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="store the MSAs from AlphaFold3 output folders")
+    add.add_argument("outputs", nargs="+")
+    add.add_argument("--inputs", nargs="+", help="only read the job folders of these input JSONs")
+    args = parser.parse_args(argv)
+
+    cache = MsaCache(args.cache)
+    added = 0
+    for data_file in find_predictions(prediction_paths(args.outputs, args.inputs)):
+        with open(data_file) as f:
+            data = json.load(f)
+        added += sum(cache.store(entity) for entity in data["sequences"])
+    print(f"{added} chains added to {args.cache}")
+
+if __name__ == "__main__":
+    main()
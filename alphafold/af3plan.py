@@ -0,0 +1,199 @@
+"""
+Size-aware packing of AlphaFold3 jobs into SLURM array tasks.
+
+fasta2json.py and pulldown.py estimate each job's size in AlphaFold3 tokens:
+one per residue or nucleotide, one per heavy atom of ligands and modified
+residues. This sorts the jobs of their manifests into size classes, each
+with its own memory and time limits, and packs them into as few array tasks
+as fit the time limit, so a task runs many small jobs back to back while a
+big assembly gets a task to itself. Planning doesn't need a GPU or network,
+--dry-run only writes the plan.
+
+    python af3plan.py fasta2json_manifest.csv --out plan1
+
+writes plan1/<class>/task_<n>/ folders of links to the JSONs, plan1/plan.csv,
+and prints one sbatch command per class for af3array.sh.
+"""
+import os
+import re
+import csv
+import sys
+import math
+import argparse
+
+# Heavy atoms of common CCD ligands; anything else counts as DEFAULT_LIGAND_ATOMS
+LIGAND_ATOMS = {
+    "ATP": 31, "ADP": 27, "AMP": 23, "GTP": 32, "GDP": 28, "NAD": 44, "NAP": 48, "FAD": 53,
+    "FMN": 31, "HEM": 43, "SAM": 27, "COA": 48, "NAG": 14, "MAN": 12, "BMA": 12, "GAL": 12,
+    "FUC": 11, "SIA": 21, "PLP": 15, "SO4": 5, "PO4": 5, "GOL": 6, "EDO": 4, "ACT": 4,
+    "MG": 1, "ZN": 1, "CA": 1, "NA": 1, "K": 1, "CL": 1, "MN": 1, "FE": 1, "CU": 1, "CO": 1, "NI": 1,
+}
+DEFAULT_LIGAND_ATOMS = 25
+# A modified residue is tokenised per atom instead of as one token
+MODIFIED_RESIDUE_TOKENS = 10
+_SMILES_ATOM = re.compile(r"\[([^\]]+)\]|Cl|Br|[BCNOPSFI]|[bcnops]")
+
+# (class, most tokens, GPU, --mem) from smallest to largest
+SIZE_CLASSES = [
+    ("small", 768, "gpu:A100:1", "32G"),
+    ("medium", 2048, "gpu:A100:1", "64G"),
+    ("large", 3584, "gpu:A100:1", "96G"),
+    ("xlarge", 5120, "gpu:A100:1", "128G"),
+    ("huge", math.inf, "gpu:A100:1", "256G"),
+]
+# Approximate seconds per seed on an A100 at these token counts, interpolated between
+INFERENCE_SECONDS = [(0, 20), (1024, 62), (2048, 275), (3072, 703), (4096, 1434), (5120, 2547)]
+# Rough minutes of MSA and template search per entity without cached MSAs, and to load the model,
+# which af3array.sh does for every job as it runs alphafold3 once per JSON
+SEARCH_MINUTES = 10
+STARTUP_MINUTES = 5
+# Tasks are given this much more time than estimated
+TIME_MARGIN = 1.5
+PLAN_COLUMNS = ["job", "tokens", "class", "task", "minutes", "json"]
+
+def smiles_atoms(smiles):
+    """Heavy atoms in a SMILES string."""
+    # Bracket atoms can be explicit hydrogens ([H], [2H]) but also e.g. [Hg]
+    return sum(1 for match in _SMILES_ATOM.finditer(smiles)
+               if match.group(1) is None or not re.match(r"\d*H(?![a-z])", match.group(1)))
+
+def entity_tokens(entity):
+    """Estimated AlphaFold3 tokens of one sequences entry, all its copies included."""
+    (kind, body), = entity.items()
+    copies = len(body["id"]) if isinstance(body["id"], list) else 1
+    if "sequence" in body:
+        tokens = len(body["sequence"]) + len(body.get("modifications", [])) * (MODIFIED_RESIDUE_TOKENS - 1)
+    elif "ccdCodes" in body:
+        tokens = sum(LIGAND_ATOMS.get(code, DEFAULT_LIGAND_ATOMS) for code in body["ccdCodes"])
+    else:
+        tokens = smiles_atoms(body["smiles"])
+    return tokens * copies
+
+def size_class(tokens):
+    return next(size for size in SIZE_CLASSES if tokens <= size[1])
+
+def job_minutes(tokens, entities=0, cached_msas=0, seeds=7):
+    """Estimated minutes for one job: loading the model, the MSA search of uncached entities and every seed's inference."""
+    for (x0, y0), (x1, y1) in zip(INFERENCE_SECONDS, INFERENCE_SECONDS[1:]):
+        if tokens <= x1:
+            break
+    seconds = y0 + (y1 - y0) * (tokens - x0) / (x1 - x0)
+    return STARTUP_MINUTES + SEARCH_MINUTES * max(entities - cached_msas, 0) + seeds * seconds / 60
+
+def plan_jobs(jobs, time_limit=16, max_jobs=None):
+    """
+    Pack manifest rows (with job, json, tokens and optionally entities and
+    cached_msas) into array tasks. Returns {class: [[row, ...] per task]},
+    each row given a minutes estimate, with every task's jobs plus the margin
+    fitting in time_limit hours where possible (first-fit, biggest jobs first).
+    """
+    classes = {}
+    for row in jobs:
+        tokens = int(row["tokens"])
+        minutes = job_minutes(tokens, int(row.get("entities") or 0), int(row.get("cached_msas") or 0))
+        classes.setdefault(size_class(tokens)[0], []).append(dict(row, tokens=tokens, minutes=round(minutes, 1)))
+
+    budget = time_limit * 60 / TIME_MARGIN
+    plan = {}
+    for name, _, _, _ in SIZE_CLASSES:
+        tasks, used = [], []
+        for row in sorted(classes.get(name, []), key=lambda row: row["minutes"], reverse=True):
+            for task, total in enumerate(used):
+                if total + row["minutes"] <= budget and (max_jobs is None or len(tasks[task]) < max_jobs):
+                    break
+            else:
+                task = len(tasks)
+                tasks.append([])
+                used.append(0)
+            tasks[task].append(row)
+            used[task] += row["minutes"]
+        if tasks:
+            plan[name] = tasks
+    return plan
+
+def resource_hints(name, tasks):
+    """sbatch options for one class: its GPU and memory, and time for its longest task plus the margin."""
+    _, _, gres, mem = next(size for size in SIZE_CLASSES if size[0] == name)
+    longest = max(sum(row["minutes"] for row in task) for task in tasks)
+    hours = math.ceil(longest * TIME_MARGIN / 60)
+    return f"--array=0-{len(tasks) - 1} --gres={gres} --mem={mem} --time={hours}:00:00"
+
+def read_jobs(manifests):
+    """Rows of fasta2json manifests or pulldown index.csv files that have a JSON to run."""
+    jobs = []
+    for manifest in manifests:
+        with open(manifest, newline="") as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames is None or not {"job", "json", "tokens"} <= set(reader.fieldnames):
+                raise ValueError(f"{manifest} has no job, json and tokens columns, rerun fasta2json.py or pulldown.py")
+            jobs += [row for row in reader if row["json"]]
+    return jobs
+
+def remove_tasks(out_dir):
+    """Remove the task_<n>/ folders of links an earlier plan left in out_dir."""
+    for name, _, _, _ in SIZE_CLASSES:
+        class_dir = os.path.join(out_dir, name)
+        if not os.path.isdir(class_dir):
+            continue
+        for task in os.listdir(class_dir):
+            task_dir = os.path.join(class_dir, task)
+            if not re.fullmatch(r"task_\d+", task) or not os.path.isdir(task_dir) or os.path.islink(task_dir):
+                continue
+            for entry in os.listdir(task_dir):
+                if os.path.islink(os.path.join(task_dir, entry)):
+                    os.remove(os.path.join(task_dir, entry))
+            # Left alone if anything but links was put in it
+            if not os.listdir(task_dir):
+                os.rmdir(task_dir)
+
+def write_plan(plan, out_dir, link=True):
+    """Write plan.csv and, with link, out_dir/<class>/task_<n>/ folders of links to each job's JSON."""
+    os.makedirs(out_dir, exist_ok=True)
+    if link:
+        # A task left over from an earlier plan would otherwise run its jobs again
+        remove_tasks(out_dir)
+    with open(os.path.join(out_dir, "plan.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=PLAN_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for name, tasks in plan.items():
+            for task, rows in enumerate(tasks):
+                task_dir = os.path.join(out_dir, name, f"task_{task}")
+                if link:
+                    os.makedirs(task_dir, exist_ok=True)
+                for row in rows:
+                    writer.writerow(dict(row, **{"class": name, "task": task}))
+                    if link:
+                        target = os.path.join(task_dir, os.path.basename(row["json"]))
+                        if os.path.lexists(target):
+                            os.remove(target)
+                        os.symlink(os.path.abspath(row["json"]), target)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack AlphaFold3 jobs into SLURM array tasks by size.")
+    parser.add_argument("manifests", nargs="+", help="fasta2json manifests or pulldown index.csv files")
+    parser.add_argument("--out", default="af3_plan", help="plan folder (default af3_plan)")
+    parser.add_argument("--time-limit", type=float, default=16, help="hours each array task may run (default 16)")
+    parser.add_argument("--max-jobs", type=int, help="most jobs in one task")
+    parser.add_argument("--dry-run", action="store_true", help="only write plan.csv, no task folders")
+    args = parser.parse_args(argv)
+
+    for manifest in args.manifests:
+        if not os.path.exists(manifest):
+            print(f"Error: File '{manifest}' not found.")
+            sys.exit(1)
+
+    try:
+        plan = plan_jobs(read_jobs(args.manifests), args.time_limit, args.max_jobs)
+        write_plan(plan, args.out, link=not args.dry_run)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    for name, tasks in plan.items():
+        jobs = sum(len(task) for task in tasks)
+        print(f"{name}: {jobs} jobs in {len(tasks)} tasks")
+        print(f"    sbatch {resource_hints(name, tasks)} af3array.sh {os.path.join(args.out, name)} <output_dir>")
+    print(f"Plan written to {os.path.join(args.out, 'plan.csv')}")
+
+if __name__ == "__main__":
+    main()
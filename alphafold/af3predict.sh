@@ -54,3 +54,7 @@ EOF
 # === Run AlphaFold3 ===
 echo "Running AlphaFold3 on $JSON_FILE ..."
 alphafold3 -o "$OUTPUT_DIR" -i "$JSON_FILE"
+
+# === Record the prediction and its MSAs for reuse (see af3index.py and af3msa.py) ===
+python af3index.py add "$OUTPUT_DIR" --inputs "$JSON_FILE"
+python af3msa.py add "$OUTPUT_DIR" --inputs "$JSON_FILE"
@@ -0,0 +1,176 @@
+"""
+Collect AlphaFold3 confidence scores from output folders into two tables.
+
+Only the small *summary_confidences.json files are read, never the CIFs, and
+folders are read in parallel threads. For each job the top-ranked sample goes
+into <out>_jobs.csv (ranked best first), and every seed and sample into
+<out>_samples.csv, written as the folders are read. Per-chain scores are
+labelled with the chain IDs fasta2json.py gave the chains, and --manifest
+(a fasta2json manifest or pulldown index.csv) adds that job's row, e.g. its
+source FASTA, bait and prey.
+
+Running it again only rereads the folders that changed since the last run.
+
+    python af3results.py AF3Outputs --manifest fasta2json_manifest.csv --out screen1_results
+"""
+import os
+import re
+import csv
+import sys
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from af3index import sanitised_name
+from fasta2json import chain_id
+
+SUMMARY_SUFFIX = "summary_confidences.json"
+SAMPLE_DIR = re.compile(r"seed-(\d+)_sample-(\d+)$")
+SCORE_COLUMNS = ["ranking_score", "iptm", "ptm", "fraction_disordered", "has_clash", "num_recycles", "chain_iptm", "chain_ptm"]
+JOB_COLUMNS = ["rank", "job", "seed", "sample", *SCORE_COLUMNS, "samples", "output", "signature"]
+SAMPLE_COLUMNS = ["job", "seed", "sample", *SCORE_COLUMNS, "output"]
+
+def find_job_dirs(paths):
+    """Yield (job name, folder) for every AlphaFold3 job folder under the given paths."""
+    for path in paths:
+        for root, dirs, files in os.walk(path):
+            if SAMPLE_DIR.search(root):
+                continue
+            names = [f[:-len(SUMMARY_SUFFIX) - 1] for f in files if f.endswith("_" + SUMMARY_SUFFIX)]
+            if names:
+                dirs[:] = []
+                yield names[0], root
+            else:
+                dirs.sort()
+
+def signature(job_dir):
+    """Changes whenever AlphaFold3 writes to the folder, so unchanged folders aren't reread."""
+    return str(os.stat(job_dir).st_mtime_ns)
+
+def _labelled(values):
+    # Per-chain scores come in chain order, the same order fasta2json.py named them in
+    return " ".join(f"{chain_id(i)}:{value}" for i, value in enumerate(values or []))
+
+def read_summary(path):
+    """Score columns of one summary_confidences.json."""
+    with open(path) as f:
+        summary = json.load(f)
+    row = {column: summary.get(column, "") for column in SCORE_COLUMNS}
+    row["chain_iptm"] = _labelled(summary.get("chain_iptm"))
+    row["chain_ptm"] = _labelled(summary.get("chain_ptm"))
+    return row
+
+def collect_job(job):
+    """Return (job row, sample rows) for one job folder."""
+    name, job_dir = job
+    samples = []
+    for entry in sorted(os.listdir(job_dir)):
+        match = SAMPLE_DIR.search(entry)
+        sample_dir = os.path.join(job_dir, entry)
+        if not match or not os.path.isdir(sample_dir):
+            continue
+        for f in os.listdir(sample_dir):
+            if f.endswith(SUMMARY_SUFFIX):
+                row = {"job": name, "seed": match.group(1), "sample": match.group(2), "output": job_dir}
+                row.update(read_summary(os.path.join(sample_dir, f)))
+                samples.append(row)
+                break
+
+    top = read_summary(os.path.join(job_dir, f"{name}_{SUMMARY_SUFFIX}"))
+    best = max(samples, key=lambda row: float(row["ranking_score"] or "-inf"), default={})
+    job_row = {"job": name, "seed": best.get("seed", ""), "sample": best.get("sample", ""),
+               "samples": len(samples), "output": job_dir}
+    job_row.update(top)
+    return job_row, samples
+
+def read_previous(out_base):
+    """Rows of an earlier run as {folder: (signature, job row, sample rows)}."""
+    jobs_csv, samples_csv = out_base + "_jobs.csv", out_base + "_samples.csv"
+    if not (os.path.exists(jobs_csv) and os.path.exists(samples_csv)):
+        return {}
+    samples = {}
+    with open(samples_csv, newline="") as f:
+        for row in csv.DictReader(f):
+            samples.setdefault(row["output"], []).append({column: row.get(column, "") for column in SAMPLE_COLUMNS})
+    previous = {}
+    with open(jobs_csv, newline="") as f:
+        for row in csv.DictReader(f):
+            job_row = {column: row.get(column, "") for column in JOB_COLUMNS}
+            previous[row["output"]] = (row["signature"], job_row, samples.get(row["output"], []))
+    return previous
+
+def read_manifests(manifests):
+    """Return ({sanitised job name: manifest row}, manifest columns) from fasta2json/pulldown manifests."""
+    rows, columns = {}, []
+    for manifest in manifests:
+        with open(manifest, newline="") as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames is None or "job" not in reader.fieldnames:
+                raise ValueError(f"{manifest} has no job column")
+            columns += [c for c in reader.fieldnames if c not in columns and c not in JOB_COLUMNS]
+            for row in reader:
+                rows[sanitised_name(row["job"])] = row
+    return rows, columns
+
+def harvest(outputs, out_base, manifests=(), workers=8):
+    """Write <out_base>_jobs.csv and <out_base>_samples.csv and return (jobs read, jobs reused)."""
+    previous = read_previous(out_base)
+    linked, extra = read_manifests(manifests)
+
+    def link(row):
+        source = linked.get(row["job"], {})
+        row.update({column: source.get(column, "") for column in extra})
+        return row
+
+    reused, todo = [], []
+    for name, job_dir in find_job_dirs(outputs):
+        stamp = signature(job_dir)
+        if previous.get(job_dir, ("",))[0] == stamp:
+            reused.append(previous[job_dir][1:])
+        else:
+            todo.append(((name, job_dir), stamp))
+
+    job_rows = []
+    with open(out_base + "_samples.csv", "w", newline="") as f, ThreadPoolExecutor(workers) as pool:
+        writer = csv.DictWriter(f, fieldnames=SAMPLE_COLUMNS + extra)
+        writer.writeheader()
+        for job_row, samples in reused:
+            job_rows.append(job_row)
+            writer.writerows(link(row) for row in samples)
+        for ((_, job_dir), stamp), (job_row, samples) in zip(todo, pool.map(collect_job, [job for job, _ in todo])):
+            job_row["signature"] = stamp
+            job_rows.append(job_row)
+            writer.writerows(link(row) for row in samples)
+
+    job_rows.sort(key=lambda row: float(row["ranking_score"] or "-inf"), reverse=True)
+    with open(out_base + "_jobs.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=JOB_COLUMNS + extra)
+        writer.writeheader()
+        for rank, row in enumerate(job_rows, 1):
+            row["rank"] = rank
+            writer.writerow(link(row))
+    return len(todo), len(reused)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collect and rank AlphaFold3 confidence scores across output folders.")
+    parser.add_argument("outputs", nargs="+", help="AlphaFold3 output folders (searched recursively)")
+    parser.add_argument("--manifest", action="append", default=[], help="fasta2json manifest or pulldown index.csv to join on (repeatable)")
+    parser.add_argument("--out", default="af3_results", help="base name of the tables (default af3_results)")
+    parser.add_argument("--workers", type=int, default=8, help="threads reading folders (default 8)")
+    args = parser.parse_args(argv)
+
+    for path in args.outputs + args.manifest:
+        if not os.path.exists(path):
+            print(f"Error: File '{path}' not found.")
+            sys.exit(1)
+
+    try:
+        read, reused = harvest(args.outputs, args.out, args.manifest, args.workers)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"{read + reused} jobs collected ({read} read, {reused} unchanged since the last run)")
+    print(f"Ranked jobs: {args.out}_jobs.csv, every sample: {args.out}_samples.csv")
+
+if __name__ == "__main__":
+    main()
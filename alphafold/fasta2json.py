@@ -2,33 +2,38 @@ import json
 import sys
 import os
 import re
+import csv
+import glob
 import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
-def generate_ids_with_error_handling(start_index, count):
-    max_ids = 52  # Maximum IDs from A to ZA
-    if start_index + count > max_ids:
-        raise ValueError("ID generation exceeds the maximum allowed range of 'ZA'.")
-
-    ids = []
-    current_index = start_index
-
-    while len(ids) < count:
-        id = ""
-        temp_index = current_index
+from af3index import DEFAULT_INDEX, ContentHasher, hash_seeds, load_index
+from af3msa import DEFAULT_MSA_CACHE, MsaCache
+from af3plan import entity_tokens
 
-        if temp_index < 26:  # A-Z
-            id = chr(65 + temp_index)
-        else:  # AA, BA, ..., ZA
-            temp_index -= 26
-            while temp_index >= 0:
-                temp_index, remainder = divmod(temp_index, 26)
-                id = chr(65 + remainder) + "A"
-                temp_index -= 1
+# A line starting with this begins a new job in a multi-job FASTA, e.g. ">>complex1"
+JOB_SEPARATOR = ">>"
+FASTA_EXTENSIONS = (".fasta", ".fa", ".faa", ".fas")
+MANIFEST_COLUMNS = ["job", "source", "entities", "chains", "json", "hash", "existing", "cached_msas", "tokens"]
 
-        ids.append(id)
-        current_index += 1
+def chain_id(index):
+    """
+    Chain ID for a 0-based chain index, in AlphaFold3's reverse spreadsheet order:
+    A-Z, then AA, BA, ..., ZA, AB, BB, ... with no upper limit.
+    """
+    letters = []
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters.append(chr(65 + remainder))
+    return "".join(letters)
 
-    return ids
+def generate_ids_with_error_handling(start_index, count):
+    if start_index < 0 or count < 0:
+        raise ValueError("Chain IDs need a non-negative start index and count.")
+    return [chain_id(index) for index in range(start_index, start_index + count)]
 
 def parse_modifications(id_line, sequence_type):
     modifications = []
@@ -72,150 +77,266 @@ def parse_bonded_atom_pairs(id_line, id_list):
 
     return bonded_atom_pairs
 
-def fasta_to_json(fasta_file):
-    json_file = os.path.splitext(fasta_file)[0] + ".json"
-    json_name = os.path.splitext(os.path.basename(fasta_file))[0]
-
-    with open(fasta_file, "r") as file:
-        lines = file.readlines()
-
-    sequences = []
+def iter_records(lines):
+    """Yield (header, sequence lines) for each FASTA record, reading lines as they come."""
     current_name = None
     current_sequence = []
-    last_id_end = 0
-    bonded_atom_pairs = []
-
     for line in lines:
         line = line.strip()
         if line.startswith(">"):
             if current_name is not None:
-                name_parts = current_name.split("#")
-                name = name_parts[0]
-                count = int(name_parts[1]) if len(name_parts) > 1 else 1
-                id_list = generate_ids_with_error_handling(last_id_end, count)
-                last_id_end += count
-
-                sequence_type = "protein"
-                if "dna" in current_name:
-                    sequence_type = "dna"
-                elif "rna" in current_name:
-                    sequence_type = "rna"
-                elif "ligand" in current_name:
-                    sequence_type = "ligand"
-                elif "smile" in current_name:
-                    sequence_type = "smile"
-
-                modifications = parse_modifications(current_name, sequence_type)
-
-                if sequence_type in {"protein", "dna", "rna"}:
-                    sequences.append({
-                        sequence_type: {
-                            "id": id_list,
-                            "sequence": "".join(current_sequence).replace(" ", "").upper(),
-                            "modifications": modifications
-                        }
-                    })
-                elif sequence_type == "ligand":
-                    ligand_sequence = "".join(current_sequence).replace(" ", "").upper()
-                    if ',' in ligand_sequence:
-                        ccdCodes = ligand_sequence.split(',')
-                    else:
-                        ccdCodes = [ligand_sequence]
-                    bonded_atom_pairs.extend(parse_bonded_atom_pairs(current_name, id_list))
-                    sequences.append({
-                        "ligand": {
-                            "id": id_list,
-                            "ccdCodes": ccdCodes
-                        }
-                    })
-                elif sequence_type == "smile":
-                    sequences.append({
-                        "ligand": {
-                            "id": id_list,
-                            "smiles": "".join(current_sequence).replace(" ", "")
-                        }
-                    })
-
+                yield current_name, current_sequence
             current_name = line[1:]
             current_sequence = []
         else:
             current_sequence.append(line)
-
     if current_name is not None:
+        yield current_name, current_sequence
+
+def record_to_entity(current_name, current_sequence, id_list):
+    """Return the AlphaFold3 sequence entry for one record and any bonded atom pairs it declares."""
+    sequence_type = "protein"
+    if "dna" in current_name:
+        sequence_type = "dna"
+    elif "rna" in current_name:
+        sequence_type = "rna"
+    elif "ligand" in current_name:
+        sequence_type = "ligand"
+    elif "smile" in current_name:
+        sequence_type = "smile"
+
+    sequence = "".join(current_sequence).replace(" ", "")
+    if sequence_type in {"protein", "dna", "rna"}:
+        return {
+            sequence_type: {
+                "id": id_list,
+                "sequence": sequence.upper(),
+                "modifications": parse_modifications(current_name, sequence_type)
+            }
+        }, []
+    elif sequence_type == "ligand":
+        return {
+            "ligand": {
+                "id": id_list,
+                "ccdCodes": sequence.upper().split(',')
+            }
+        }, parse_bonded_atom_pairs(current_name, id_list)
+    return {
+        "ligand": {
+            "id": id_list,
+            "smiles": sequence
+        }
+    }, []
+
+def iter_entities(lines):
+    """Yield (sequence entry, bonded atom pairs) for each record, numbering chains across the job."""
+    last_id_end = 0
+    for current_name, current_sequence in iter_records(lines):
         name_parts = current_name.split("#")
-        name = name_parts[0]
         count = int(name_parts[1]) if len(name_parts) > 1 else 1
         id_list = generate_ids_with_error_handling(last_id_end, count)
         last_id_end += count
+        yield record_to_entity(current_name, current_sequence, id_list)
 
-        sequence_type = "protein"
-        if "dna" in current_name:
-            sequence_type = "dna"
-        elif "rna" in current_name:
-            sequence_type = "rna"
-        elif "ligand" in current_name:
-            sequence_type = "ligand"
-        elif "smile" in current_name:
-            sequence_type = "smile"
-
-        modifications = parse_modifications(current_name, sequence_type)
-
-        if sequence_type in {"protein", "dna", "rna"}:
-            sequences.append({
-                sequence_type: {
-                    "id": id_list,
-                    "sequence": "".join(current_sequence).replace(" ", "").upper(),
-                    "modifications": modifications
-                }
-            })
-        elif sequence_type == "ligand":
-            ligand_sequence = "".join(current_sequence).replace(" ", "").upper()
-            if ',' in ligand_sequence:
-                ccdCodes = ligand_sequence.split(',')
-            else:
-                ccdCodes = [ligand_sequence]
-            bonded_atom_pairs.extend(parse_bonded_atom_pairs(current_name, id_list))
-            sequences.append({
-                "ligand": {
-                    "id": id_list,
-                    "ccdCodes": ccdCodes
-                }
-            })
-        elif sequence_type == "smile":
-            sequences.append({
-                "ligand": {
-                    "id": id_list,
-                    "smiles": "".join(current_sequence).replace(" ", "")
-                }
-            })
+def _indented(value, level=2):
+    return json.dumps(value, indent=2).replace("\n", "\n" + " " * level)
 
-    # Create random seed
-    NUM_SEEDS = 7  
+def write_af3_json(out, json_name, lines, num_seeds=7, model_seeds=None, msa_cache=None):
+    """
+    Write the AlphaFold3 input for one job's FASTA lines to `out` a record at a
+    time, laid out exactly as json.dump(..., indent=2) would. Returns the
+    number of entities, chains and estimated tokens (see af3plan.py)
+    written. Chains found in msa_cache (an
+    af3msa.MsaCache) get their MSAs and templates filled in.
+    """
+    if model_seeds is None:
+        # Create multiple random seeds
+        model_seeds = [random.randint(1, 100000) for _ in range(num_seeds)]
 
-    # Create multiple random seeds
-    model_seeds = [random.randint(1, 100000) for _ in range(NUM_SEEDS)]
-    
-    data = {
-        "name": json_name,
-        "modelSeeds": model_seeds,
-        "sequences": sequences,
-        "bondedAtomPairs": bonded_atom_pairs,
-        "dialect": "alphafold3",
-        "version": 1
-    }
-
-    with open(json_file, "w") as json_out:
-        json.dump(data, json_out, indent=2)
+    out.write("{\n")
+    out.write(f'  "name": {json.dumps(json_name)},\n')
+    out.write(f'  "modelSeeds": {_indented(model_seeds)},\n')
+    out.write('  "sequences": [')
+    entities = chains = tokens = 0
+    bonded_atom_pairs = []
+    for entity, pairs in iter_entities(lines):
+        if msa_cache is not None:
+            msa_cache.fill(entity)
+        out.write(",\n    " if entities else "\n    ")
+        out.write(_indented(entity, 4))
+        bonded_atom_pairs.extend(pairs)
+        entities += 1
+        chains += len(next(iter(entity.values()))["id"])
+        tokens += entity_tokens(entity)
+    out.write("\n  ],\n" if entities else "],\n")
+    out.write(f'  "bondedAtomPairs": {_indented(bonded_atom_pairs)},\n')
+    out.write('  "dialect": "alphafold3",\n  "version": 1\n}')
+    return entities, chains, tokens
+
+def write_json_file(json_file, json_name, lines, **kwargs):
+    """
+    write_af3_json into json_file, written under a temporary name and renamed once
+    complete, so a FASTA that fails to parse doesn't leave a half-written JSON behind.
+    """
+    temp = json_file + ".tmp"
+    try:
+        with open(temp, "w") as json_out:
+            result = write_af3_json(json_out, json_name, lines, **kwargs)
+        os.replace(temp, json_file)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return result
+
+def job_hash(lines):
+    """Content hash of one job's FASTA lines, see af3index.py."""
+    hasher = ContentHasher()
+    for entity, pairs in iter_entities(lines):
+        hasher.add(entity, pairs)
+    return hasher.hexdigest()
+
+def fasta_to_json(fasta_file, json_file=None):
+    json_file = json_file or os.path.splitext(fasta_file)[0] + ".json"
+    json_name = os.path.splitext(os.path.basename(json_file))[0]
+
+    with open(fasta_file, "r") as file:
+        write_json_file(json_file, json_name, file)
     print(f"\nConversion complete. JSON file saved as {json_file}")
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python script_name.py <fasta_file>")
-        sys.exit(1)
+def find_fasta_files(inputs):
+    """Expand directories (every FASTA inside) and glob patterns into a list of FASTA files."""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(sorted(os.path.join(item, name) for name in os.listdir(item)
+                                if name.lower().endswith(FASTA_EXTENSIONS)))
+        elif os.path.exists(item):
+            files.append(item)
+        else:
+            matches = sorted(glob.glob(item))
+            if not matches:
+                raise FileNotFoundError(f"File '{item}' not found.")
+            files.extend(matches)
+    return files
+
+def split_jobs(fasta_file):
+    """
+    Return [(job name, first line, end line)] for each ">>name" section, or one
+    job covering the whole file (end None) if it has no job lines.
+    """
+    jobs = []
+    records_before = False
+    with open(fasta_file, "r") as file:
+        for number, line in enumerate(file):
+            if line.startswith(JOB_SEPARATOR):
+                if records_before:
+                    raise ValueError(f"{fasta_file}: records before the first '{JOB_SEPARATOR}' job line")
+                if jobs:
+                    jobs[-1][2] = number
+                jobs.append([line[len(JOB_SEPARATOR):].strip(), number + 1, None])
+            elif not jobs and line.strip():
+                records_before = True
+    if not jobs:
+        return [(os.path.splitext(os.path.basename(fasta_file))[0], 0, None)]
+    return [tuple(job) for job in jobs]
 
-    fasta_file = sys.argv[1]
-    if not os.path.exists(fasta_file):
-        print(f"Error: File '{fasta_file}' not found.")
+# {hash: output folder} of earlier predictions, set in each worker by convert_batch
+_predicted = {}
+
+def _use_index(predicted):
+    global _predicted
+    _predicted = predicted
+
+def convert_job(job):
+    """Write one job's JSON (unless it was already predicted and skip_existing) and return its manifest row."""
+    name, source, start, end, json_file, skip_existing, seeded, msa_dir = job
+    with open(source, "r") as file:
+        digest = job_hash(islice(file, start, end))
+    row = {"job": name, "source": source, "hash": digest, "existing": _predicted.get(digest, "")}
+    if row["existing"] and skip_existing:
+        row.update(entities="", chains="", json="", cached_msas="", tokens="")
+        return row
+
+    msa_cache = MsaCache(msa_dir) if msa_dir else None
+    with open(source, "r") as file:
+        entities, chains, tokens = write_json_file(json_file, name, islice(file, start, end),
+                                                   model_seeds=hash_seeds(digest) if seeded else None, msa_cache=msa_cache)
+    row.update(entities=entities, chains=chains, json=json_file, cached_msas=msa_cache.hits if msa_cache else "",
+               tokens=tokens)
+    return row
+
+def convert_batch(inputs, out_dir=None, workers=1, manifest="fasta2json_manifest.csv",
+                  predicted=None, skip_existing=False, seeded=False, msa_dir=None):
+    """
+    Convert every job in the inputs, optionally in parallel, and write a manifest of them.
+    Jobs whose hash is in `predicted` are reported, or left out with skip_existing.
+    With seeded, model seeds come from the job hash instead of being random.
+    With msa_dir, chains in that MSA cache (see af3msa.py) get their MSAs filled in.
+    """
+    jobs = []
+    seen = {}
+    for fasta_file in find_fasta_files(inputs):
+        for name, start, end in split_jobs(fasta_file):
+            if not name:
+                raise ValueError(f"{fasta_file}: job line without a name")
+            if name in seen:
+                raise ValueError(f"Job '{name}' appears in both {seen[name]} and {fasta_file}")
+            seen[name] = fasta_file
+            json_dir = out_dir or os.path.dirname(fasta_file)
+            jobs.append((name, fasta_file, start, end, os.path.join(json_dir, name + ".json"),
+                         skip_existing, seeded, msa_dir))
+
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=_use_index, initargs=(predicted or {},)) as pool:
+            rows = list(pool.map(convert_job, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+    else:
+        _use_index(predicted or {})
+        rows = [convert_job(job) for job in jobs]
+
+    with open(manifest, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert FASTA files into AlphaFold3 JSON inputs.")
+    parser.add_argument("inputs", nargs="+", help="FASTA files, directories of them or glob patterns")
+    parser.add_argument("--out-dir", help="where to write the JSON files (default next to each FASTA)")
+    parser.add_argument("--workers", type=int, default=1, help="processes to convert jobs in (default 1)")
+    parser.add_argument("--manifest", help="CSV listing every job (default fasta2json_manifest.csv for batches)")
+    parser.add_argument("--index", help=f"report jobs already predicted according to this index (see af3index.py, default {DEFAULT_INDEX} with --skip-existing)")
+    parser.add_argument("--skip-existing", action="store_true", help="don't write JSONs for jobs that were already predicted")
+    parser.add_argument("--hash-seeds", action="store_true", help="derive model seeds from the job's content instead of picking them at random")
+    parser.add_argument("--msa-cache", nargs="?", const=DEFAULT_MSA_CACHE, metavar="DIR",
+                        help=f"fill in MSAs and templates of chains found in this cache (see af3msa.py, default {DEFAULT_MSA_CACHE})")
+    args = parser.parse_args(argv)
+
+    checking = args.index or args.skip_existing
+    try:
+        # One plain FASTA file converts exactly as it always has
+        single = (len(args.inputs) == 1 and os.path.isfile(args.inputs[0]) and not args.out_dir
+                  and not args.manifest and not checking and not args.hash_seeds and not args.msa_cache
+                  and split_jobs(args.inputs[0])[0][1:] == (0, None))
+        if single:
+            fasta_to_json(args.inputs[0])
+            return
+        predicted = load_index(args.index or DEFAULT_INDEX) if checking else {}
+        rows = convert_batch(args.inputs, args.out_dir, args.workers, args.manifest or "fasta2json_manifest.csv",
+                             predicted, args.skip_existing, args.hash_seeds, args.msa_cache)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
         sys.exit(1)
+    for row in rows:
+        if row["existing"]:
+            print(f"{row['job']}: already predicted in {row['existing']}" + ("" if row["json"] else ", skipped"))
+        else:
+            cached = f", {row['cached_msas']} entities from the MSA cache" if args.msa_cache else ""
+            print(f"{row['job']}: {row['chains']} chains, ~{row['tokens']} tokens{cached} -> {row['json']}")
+    written = sum(1 for row in rows if row["json"])
+    print(f"\nConversion complete. {written} JSON files written, all {len(rows)} jobs listed in {args.manifest or 'fasta2json_manifest.csv'}")
 
-    fasta_to_json(fasta_file)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Bait x prey AlphaFold3 pulldown screens.
+
+Pairs every record of a bait FASTA with every record of a prey FASTA and writes
+one AF3 JSON per pair, spread round-robin over N task directories
+(task_0 ... task_N-1) so the whole screen can be run as one SLURM array with
+af3array.sh. Records use the same header syntax as fasta2json.py (#count,
+&modifications, ligand/dna/rna/smile). Preys are read one at a time, so memory
+stays flat however big the screen is.
+
+Usage:
+    python pulldown.py baits.fasta preys.fasta --shards 40 --out screen1
+"""
+import os
+import re
+import csv
+import sys
+import argparse
+
+from af3index import DEFAULT_INDEX, hash_seeds, load_index
+from af3msa import DEFAULT_MSA_CACHE, MsaCache
+from fasta2json import iter_records, job_hash, write_json_file
+
+INDEX_COLUMNS = ["job", "task", "bait", "prey", "entities", "chains", "json", "hash", "existing", "cached_msas", "tokens"]
+
+def record_name(header):
+    """The name part of a header (before any #count or &modification), made safe for file names."""
+    name = re.split(r"[#&]", header, 1)[0].strip()
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name) or "record"
+
+def iter_pairs(bait_file, prey_file):
+    """Yield (job name, bait name, prey name, FASTA lines) for every bait x prey pair."""
+    with open(bait_file, "r") as file:
+        baits = [(record_name(header), [">" + header] + lines) for header, lines in iter_records(file)]
+    for bait, bait_lines in baits:
+        with open(prey_file, "r") as file:
+            for header, lines in iter_records(file):
+                prey = record_name(header)
+                yield f"{bait}_{prey}", bait, prey, bait_lines + [">" + header] + lines
+
+def clear_tasks(out_dir):
+    """Remove the JSONs an earlier screen left in out_dir/task_<n>/, and task folders that end up empty."""
+    if not os.path.isdir(out_dir):
+        return
+    for task in os.listdir(out_dir):
+        task_dir = os.path.join(out_dir, task)
+        if not re.fullmatch(r"task_\d+", task) or not os.path.isdir(task_dir):
+            continue
+        for entry in os.listdir(task_dir):
+            if entry.endswith(".json"):
+                os.remove(os.path.join(task_dir, entry))
+        if not os.listdir(task_dir):
+            os.rmdir(task_dir)
+
+def write_screen(bait_file, prey_file, out_dir, shards, predicted=None, skip_existing=False, seeded=False, msa_dir=None):
+    """
+    Write every pair's JSON into out_dir/task_<n>/ and return the rows of the index.
+    Pairs whose hash is in `predicted`, or that repeat an earlier pair of the
+    screen (bait A x prey B and bait B x prey A), are reported, or left out
+    with skip_existing. With msa_dir, chains in that MSA cache get their MSAs filled in.
+    """
+    if shards < 1:
+        raise ValueError("--shards must be at least 1")
+    # af3array.sh runs every JSON in a task folder, old ones included
+    clear_tasks(out_dir)
+    for task in range(shards):
+        os.makedirs(os.path.join(out_dir, f"task_{task}"), exist_ok=True)
+
+    predicted = dict(predicted or {})
+    rows = []
+    seen = set()
+    written = 0
+    for name, bait, prey, lines in iter_pairs(bait_file, prey_file):
+        if name in seen:
+            raise ValueError(f"Two pairs would both be called '{name}', give the records unique names")
+        seen.add(name)
+        digest = job_hash(lines)
+        row = {"job": name, "bait": bait, "prey": prey, "hash": digest, "existing": predicted.get(digest, "")}
+        if row["existing"] and skip_existing:
+            rows.append(row)
+            continue
+
+        task = written % shards
+        written += 1
+        json_file = os.path.join(out_dir, f"task_{task}", name + ".json")
+        msa_cache = MsaCache(msa_dir) if msa_dir else None
+        entities, chains, tokens = write_json_file(json_file, name, lines, model_seeds=hash_seeds(digest) if seeded else None,
+                                                   msa_cache=msa_cache)
+        row.update(task=task, entities=entities, chains=chains, json=json_file,
+                   cached_msas=msa_cache.hits if msa_cache else "", tokens=tokens)
+        rows.append(row)
+        predicted.setdefault(digest, json_file)
+
+    with open(os.path.join(out_dir, "index.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=INDEX_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write AlphaFold3 inputs for every bait x prey pair, split into SLURM array tasks.")
+    parser.add_argument("bait_fasta")
+    parser.add_argument("prey_fasta")
+    parser.add_argument("--out", default="pulldown", help="screen directory (default pulldown)")
+    parser.add_argument("--shards", type=int, default=1, help="number of array tasks to split the jobs over (default 1)")
+    parser.add_argument("--index", help=f"report pairs already predicted according to this index (see af3index.py, default {DEFAULT_INDEX} with --skip-existing)")
+    parser.add_argument("--skip-existing", action="store_true", help="leave out pairs that were already predicted")
+    parser.add_argument("--hash-seeds", action="store_true", help="derive model seeds from each pair's content instead of picking them at random")
+    parser.add_argument("--msa-cache", nargs="?", const=DEFAULT_MSA_CACHE, metavar="DIR",
+                        help=f"fill in MSAs and templates of chains found in this cache (see af3msa.py, default {DEFAULT_MSA_CACHE})")
+    args = parser.parse_args(argv)
+
+    for fasta_file in (args.bait_fasta, args.prey_fasta):
+        if not os.path.exists(fasta_file):
+            print(f"Error: File '{fasta_file}' not found.")
+            sys.exit(1)
+
+    try:
+        predicted = load_index(args.index or DEFAULT_INDEX) if args.index or args.skip_existing else {}
+        rows = write_screen(args.bait_fasta, args.prey_fasta, args.out, args.shards,
+                            predicted, args.skip_existing, args.hash_seeds, args.msa_cache)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    existing = [row for row in rows if row["existing"]]
+    if existing:
+        print(f"{len(existing)} pairs were already predicted or repeat an earlier pair" + (" and were skipped" if args.skip_existing else "")
+              + f", see the existing column of {os.path.join(args.out, 'index.csv')}")
+    written = sum(1 for row in rows if row.get("json"))
+    print(f"{written} jobs written to {args.shards} task directories in {args.out}, listed in {os.path.join(args.out, 'index.csv')}")
+    print(f"Submit with: sbatch --array=0-{args.shards - 1} af3array.sh {args.out} <output_dir>")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Benchmarks for the protparam scripts.
+
+Generates synthetic FASTA and CSV libraries with antibody-like length
+distributions and duplicate rates, times each metric function and the
+end-to-end fastaprot.py / csvprot.py runs, and writes the results to JSON.
+Given a stored baseline it flags anything that got slower.
+
+Usage:
+    python benchprot.py --sizes 1000 100000 --output bench.json
+    python benchprot.py --sizes 1000 100000 --baseline bench.json
+"""
+import os
+import csv
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from itertools import islice
+
+from protlib import (molecular_weight, calculate_pI, extinction_coefficient, instability_index,
+                     aliphatic_index, half_life, iter_fasta, output_base)
+from protbatch import metric_rows, np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Approximate residue frequencies of antibody variable domains
+AA_FREQ = {
+    "A": 5.5, "R": 4.0, "N": 3.5, "D": 4.0, "C": 1.8, "Q": 3.8, "E": 3.8,
+    "G": 8.5, "H": 1.2, "I": 2.8, "L": 6.5, "K": 3.5, "M": 1.5, "F": 3.2,
+    "P": 4.5, "S": 13.0, "T": 7.5, "W": 2.2, "Y": 7.0, "V": 8.0
+}
+
+# (min, max) length ranges, picked with equal weight
+LENGTHS = {
+    "vhh": [(110, 135)],
+    "igg": [(440, 460), (210, 220)],
+    "mixed": [(110, 135), (440, 460), (210, 220)],
+}
+
+METRICS = [molecular_weight, calculate_pI, extinction_coefficient, instability_index, aliphatic_index, half_life]
+
+
+def synthetic_sequences(n, profile="vhh", duplicates=0.3, seed=0):
+    """
+    Yield n sequences from a handful of frameworks with randomised CDR-like
+    stretches. About `duplicates` of them repeat an earlier sequence.
+    """
+    rng = random.Random(seed)
+    residues, weights = list(AA_FREQ), list(AA_FREQ.values())
+    frameworks = []
+    for _ in range(50):
+        low, high = rng.choice(LENGTHS[profile])
+        frameworks.append(rng.choices(residues, weights, k=rng.randint(low, high)))
+
+    recent = []
+    for _ in range(n):
+        if recent and rng.random() < duplicates:
+            yield rng.choice(recent)
+            continue
+        seq = list(rng.choice(frameworks))
+        # Three variable loops roughly where CDRs sit
+        for centre in (0.25, 0.45, 0.8):
+            start = int(len(seq) * centre)
+            seq[start:start + 8] = rng.choices(residues, weights, k=8)
+        seq = "".join(seq)
+        recent.append(seq)
+        if len(recent) > 10000:
+            recent.pop(rng.randrange(len(recent)))
+        yield seq
+
+
+def write_workload(workdir, n, profile, duplicates, seed):
+    """Write (or reuse) the FASTA and CSV for one workload size."""
+    base = os.path.join(workdir, f"bench_{profile}_{n}")
+    fasta_file, csv_file = base + ".fasta", base + ".csv"
+    if not (os.path.exists(fasta_file) and os.path.exists(csv_file)):
+        os.makedirs(workdir, exist_ok=True)
+        with open(fasta_file, "w") as fa, open(csv_file, "w", newline="") as cs:
+            writer = csv.writer(cs)
+            writer.writerow(["clone", "VHH"])
+            for i, seq in enumerate(synthetic_sequences(n, profile, duplicates, seed)):
+                fa.write(f">clone{i}\n")
+                for k in range(0, len(seq), 60):
+                    fa.write(seq[k:k + 60] + "\n")
+                writer.writerow([f"clone{i}", seq])
+    return fasta_file, csv_file
+
+
+def result(name, size, n, residues, seconds, peak_rss_mb=None):
+    """One benchmark of n sequences timed for the workload of `size` sequences."""
+    return {
+        "name": name,
+        "size": size,
+        "timed": n,
+        "seconds": round(seconds, 4),
+        "seqs_per_s": round(n / seconds, 1) if seconds else None,
+        "residues_per_s": round(residues / seconds, 1) if seconds else None,
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+def time_metrics(fasta_file, size, sample):
+    """Time each per-sequence function and the block engine on up to `sample` sequences of the workload."""
+    seqs = [seq for _, seq in islice(iter_fasta(fasta_file), sample)]
+    residues = sum(map(len, seqs))
+    results = []
+    for func in METRICS:
+        start = time.perf_counter()
+        for seq in seqs:
+            func(seq)
+        results.append(result(f"metric:{func.__name__}", size, len(seqs), residues, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    metric_rows(seqs)
+    results.append(result("metric:metric_rows", size, len(seqs), residues, time.perf_counter() - start))
+    return results
+
+
+def time_cli(script, input_file, n, residues, extra_args, name=None, keep_output=False):
+    """Run one of the CLIs in a child process, returning its timing and peak RSS. Its output is deleted unless keep_output."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, script), input_file] + extra_args,
+                            stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # fastaprot and csvprot would otherwise leave the same bench_*_protparam.csv behind
+    output_file = output_base(input_file) + "_protparam.csv"
+    if not keep_output and os.path.exists(output_file):
+        os.remove(output_file)
+    if proc.returncode:
+        raise RuntimeError(f"{script} exited with status {proc.returncode}")
+    # ru_maxrss is in KB on Linux
+    return result(name or f"cli:{script}", n, n, residues, seconds, round(usage.ru_maxrss / 1024, 1))
+
+
+def compare(results, baseline, tolerance):
+    """Return a message for every benchmark that is more than `tolerance` slower than the baseline."""
+    before = {(r["name"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = before.get((r["name"], r["size"]))
+        if old and old["seqs_per_s"] and r["seqs_per_s"] and r["seqs_per_s"] < old["seqs_per_s"] * (1 - tolerance):
+            regressions.append(f"{r['name']} at {r['size']} sequences: "
+                               f"{old['seqs_per_s']:.0f} -> {r['seqs_per_s']:.0f} seqs/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the protparam scripts on synthetic libraries.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="numbers of sequences (default 1000 10000 100000)")
+    parser.add_argument("--profile", choices=sorted(LENGTHS), default="vhh", help="length distribution (default vhh)")
+    parser.add_argument("--duplicates", type=float, default=0.3, help="fraction of repeated sequences (default 0.3)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample", type=int, default=20000, help="sequences used to time individual metrics (default 20000)")
+    parser.add_argument("--jobs", type=int, default=1, help="passed to the CLIs (default 1)")
+    parser.add_argument("--workdir", default="bench_data", help="where workloads are written and reused (default bench_data)")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before flagging (default 0.15)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for n in args.sizes:
+        fasta_file, csv_file = write_workload(args.workdir, n, args.profile, args.duplicates, args.seed)
+        residues = sum(len(seq) for _, seq in iter_fasta(fasta_file))
+        results.extend(time_metrics(fasta_file, n, args.sample))
+        results.append(time_cli("fastaprot.py", fasta_file, n, residues, ["--jobs", str(args.jobs)]))
+        results.append(time_cli("csvprot.py", csv_file, n, residues, ["--jobs", str(args.jobs)], keep_output=True))
+        # Rerun over the output just written, every row should be copied rather than recalculated
+        results.append(time_cli("csvprot.py", csv_file, n, residues, ["--jobs", str(args.jobs), "--incremental"],
+                                name="cli:csvprot.py --incremental"))
+
+    for r in results:
+        rss = f"{r['peak_rss_mb']:>8.1f} MB" if r["peak_rss_mb"] is not None else ""
+        print(f"{r['name']:<32}{r['size']:>10}{r['seconds']:>10.3f} s{r['seqs_per_s'] or 0:>14.0f} seqs/s{rss}")
+
+    report = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "numpy": np.__version__ if np is not None else None,
+        "profile": args.profile,
+        "duplicates": args.duplicates,
+        "jobs": args.jobs,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION: {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -1,280 +1,281 @@
+import os
 import sys
 import csv
-from math import exp
-
-
-
-# Fixed pKa values for sidechains
-pKa_fixed = {"K": 10.0, "R": 12.0, "H": 5.98, "D": 4.05, "E": 4.45, "C": 9.0, "Y": 10.0}
-# Approx. N-terminal pKa depending on residue
-Nterm_pKa = {"A": 7.59, "M": 7.0, "S": 6.93, "P": 8.36, "T": 6.82, "V": 7.44, "E": 7.70}
-# C-terminal default pKa
-Cterm_default = 3.55
-# C-terminal corrections for D/E
-pK_cterm = {"D": 4.55, "E": 4.75}
-
-aa_weights = {
-    "A": 89.0932, "R": 174.201, "N": 132.1179, "D": 133.1027,
-    "C": 121.1582, "E": 147.1293, "Q": 146.1445, "G": 75.0666,
-    "H": 155.1546, "I": 131.1729, "L": 131.1729, "K": 146.1876,
-    "M": 149.2113, "F": 165.1891, "P": 115.1305, "S": 105.0926,
-    "T": 119.1192, "W": 204.2252, "Y": 181.1885, "V": 117.1463
-}
-
-aa_extinction = {
-    "W": 5500,
-    "Y": 1490,
-    "C": 125
-}
-
-aa_volume = {
-    "A": 88.6, "R": 173.4, "N": 114.1, "D": 111.1, "C": 108.5, "E": 138.4,
-    "Q": 143.8, "G": 60.1, "H": 153.2, "I": 166.7, "L": 166.7, "K": 168.6,
-    "M": 162.9, "F": 189.9, "P": 112.7, "S": 89.0, "T": 116.1, "W": 227.8,
-    "Y": 193.6, "V": 140.0
-}
-
-aa_ai = {"A": 71.09, "V": 99.07, "I": 100.00, "L": 97.00, "F": 100.00, "C": 50.00, "M": 60.00}
-
-# ===================
-# DIWV (Instability Index) from Biopython
-# ===================
-
-DIWV = {'A': {'A': 1.0, 'C': 44.94, 'E': 1.0, 'D': -7.49,
-              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': -7.49,
-              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': 1.0,
-              'Q': 1.0, 'P': 20.26, 'S': 1.0, 'R': 1.0,
-              'T': 1.0, 'W': 1.0, 'V': 1.0, 'Y': 1.0},
-        'C': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 20.26,
-              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 33.60,
-              'K': 1.0, 'M': 33.60, 'L': 20.26, 'N': 1.0,
-              'Q': -6.54, 'P': 20.26, 'S': 1.0, 'R': 1.0,
-              'T': 33.60, 'W': 24.68, 'V': -6.54, 'Y': 1.0},
-        'E': {'A': 1.0, 'C': 44.94, 'E': 33.60, 'D': 20.26,
-              'G': 1.0, 'F': 1.0, 'I': 20.26, 'H': -6.54,
-              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': 1.0,
-              'Q': 20.26, 'P': 20.26, 'S': 20.26, 'R': 1.0,
-              'T': 1.0, 'W': -14.03, 'V': 1.0, 'Y': 1.0},
-        'D': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 1.0,
-              'G': 1.0, 'F': -6.54, 'I': 1.0, 'H': 1.0,
-              'K': -7.49, 'M': 1.0, 'L': 1.0, 'N': 1.0,
-              'Q': 1.0, 'P': 1.0, 'S': 20.26, 'R': -6.54,
-              'T': -14.03, 'W': 1.0, 'V': 1.0, 'Y': 1.0},
-        'G': {'A': -7.49, 'C': 1.0, 'E': -6.54, 'D': 1.0,
-              'G': 13.34, 'F': 1.0, 'I': -7.49, 'H': 1.0,
-              'K': -7.49, 'M': 1.0, 'L': 1.0, 'N': -7.49,
-              'Q': 1.0, 'P': 1.0, 'S': 1.0, 'R': 1.0,
-              'T': -7.49, 'W': 13.34, 'V': 1.0, 'Y': -7.49},
-        'F': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 13.34,
-              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 1.0,
-              'K': -14.03, 'M': 1.0, 'L': 1.0, 'N': 1.0,
-              'Q': 1.0, 'P': 20.26, 'S': 1.0, 'R': 1.0,
-              'T': 1.0, 'W': 1.0, 'V': 1.0, 'Y': 33.601},
-        'I': {'A': 1.0, 'C': 1.0, 'E': 44.94, 'D': 1.0,
-              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 13.34,
-              'K': -7.49, 'M': 1.0, 'L': 20.26, 'N': 1.0,
-              'Q': 1.0, 'P': -1.88, 'S': 1.0, 'R': 1.0,
-              'T': 1.0, 'W': 1.0, 'V': -7.49, 'Y': 1.0},
-        'H': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 1.0,
-              'G': -9.37, 'F': -9.37, 'I': 44.94, 'H': 1.0,
-              'K': 24.68, 'M': 1.0, 'L': 1.0, 'N': 24.68,
-              'Q': 1.0, 'P': -1.88, 'S': 1.0, 'R': 1.0,
-              'T': -6.54, 'W': -1.88, 'V': 1.0, 'Y': 44.94},
-        'K': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 1.0,
-              'G': -7.49, 'F': 1.0, 'I': -7.49, 'H': 1.0,
-              'K': 1.0, 'M': 33.60, 'L': -7.49, 'N': 1.0,
-              'Q': 24.64, 'P': -6.54, 'S': 1.0, 'R': 33.60,
-              'T': 1.0, 'W': 1.0, 'V': -7.49, 'Y': 1.0},
-        'M': {'A': 13.34, 'C': 1.0, 'E': 1.0, 'D': 1.0,
-              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 58.28,
-              'K': 1.0, 'M': -1.88, 'L': 1.0, 'N': 1.0,
-              'Q': -6.54, 'P': 44.94, 'S': 44.94, 'R': -6.54,
-              'T': -1.88, 'W': 1.0, 'V': 1.0, 'Y': 24.68},
-        'L': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 1.0,
-              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 1.0,
-              'K': -7.49, 'M': 1.0, 'L': 1.0, 'N': 1.0,
-              'Q': 33.60, 'P': 20.26, 'S': 1.0, 'R': 20.26,
-              'T': 1.0, 'W': 24.68, 'V': 1.0, 'Y': 1.0},
-        'N': {'A': 1.0, 'C': -1.88, 'E': 1.0, 'D': 1.0,
-              'G': -14.03, 'F': -14.03, 'I': 44.94, 'H': 1.0,
-              'K': 24.68, 'M': 1.0, 'L': 1.0, 'N': 1.0,
-              'Q': -6.54, 'P': -1.88, 'S': 1.0, 'R': 1.0,
-              'T': -7.49, 'W': -9.37, 'V': 1.0, 'Y': 1.0},
-        'Q': {'A': 1.0, 'C': -6.54, 'E': 20.26, 'D': 20.26,
-              'G': 1.0, 'F': -6.54, 'I': 1.0, 'H': 1.0,
-              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': 1.0,
-              'Q': 20.26, 'P': 20.26, 'S': 44.94, 'R': 1.0,
-              'T': 1.0, 'W': 1.0, 'V': -6.54, 'Y': -6.54},
-        'P': {'A': 20.26, 'C': -6.54, 'E': 18.38, 'D': -6.54,
-              'G': 1.0, 'F': 20.26, 'I': 1.0, 'H': 1.0,
-              'K': 1.0, 'M': -6.54, 'L': 1.0, 'N': 1.0,
-              'Q': 20.26, 'P': 20.26, 'S': 20.26, 'R': -6.54,
-              'T': 1.0, 'W': -1.88, 'V': 20.26, 'Y': 1.0},
-        'S': {'A': 1.0, 'C': 33.60, 'E': 20.26, 'D': 1.0,
-              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 1.0,
-              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': 1.0,
-              'Q': 20.26, 'P': 44.94, 'S': 20.26, 'R': 20.26,
-              'T': 1.0, 'W': 1.0, 'V': 1.0, 'Y': 1.0},
-        'R': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 1.0,
-              'G': -7.49, 'F': 1.0, 'I': 1.0, 'H': 20.26,
-              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': 13.34,
-              'Q': 20.26, 'P': 20.26, 'S': 44.94, 'R': 58.28,
-              'T': 1.0, 'W': 58.28, 'V': 1.0, 'Y': -6.54},
-        'T': {'A': 1.0, 'C': 1.0, 'E': 20.26, 'D': 1.0,
-              'G': -7.49, 'F': 13.34, 'I': 1.0, 'H': 1.0,
-              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': -14.03,
-              'Q': -6.54, 'P': 1.0, 'S': 1.0, 'R': 1.0,
-              'T': 1.0, 'W': -14.03, 'V': 1.0, 'Y': 1.0},
-        'W': {'A': -14.03, 'C': 1.0, 'E': 1.0, 'D': 1.0,
-              'G': -9.37, 'F': 1.0, 'I': 1.0, 'H': 24.68,
-              'K': 1.0, 'M': 24.68, 'L': 13.34, 'N': 13.34,
-              'Q': 1.0, 'P': 1.0, 'S': 1.0, 'R': 1.0,
-              'T': -14.03, 'W': 1.0, 'V': -7.49, 'Y': 1.0},
-        'V': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': -14.03,
-              'G': -7.49, 'F': 1.0, 'I': 1.0, 'H': 1.0,
-              'K': -1.88, 'M': 1.0, 'L': 1.0, 'N': 1.0,
-              'Q': 1.0, 'P': 20.26, 'S': 1.0, 'R': 1.0,
-              'T': -7.49, 'W': 1.0, 'V': 1.0, 'Y': -6.54},
-        'Y': {'A': 24.68, 'C': 1.0, 'E': -6.54, 'D': 24.68,
-              'G': -7.49, 'F': 1.0, 'I': 1.0, 'H': 13.34,
-              'K': 1.0, 'M': 44.94, 'L': 1.0, 'N': 1.0,
-              'Q': 1.0, 'P': 13.34, 'S': 1.0, 'R': -15.91,
-              'T': -7.49, 'W': -9.37, 'V': 1.0, 'Y': 13.34},
-        }
-
-def read_fasta_multiseq(filename):
-    """Read a multi-sequence FASTA and return dict {header: sequence}."""
-    sequences = {}
-    header = None
-    seq = ""
-    with open(filename, "r") as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith(">"):
-                if header and seq:
-                    sequences[header] = seq.upper()
-                header = line[1:].split()[0]
-                seq = ""
-            else:
-                seq += line
-        if header and seq:
-            sequences[header] = seq.upper()
-    return sequences
-
-def molecular_weight(seq):
-    return (sum(aa_weights[aa] for aa in seq) - (len(seq) - 1) * 18.01528) / 1000
-
-def calculate_pI(seq, epsilon=0.0001):
-    seq = seq.upper()
-    Nterm = Nterm_pKa.get(seq[0], 7.5)
-    last = seq[-1]
-    Cterm = pK_cterm.get(last, Cterm_default)
-
-    # Count charged residues
-    counts = {aa: seq.count(aa) for aa in "KRHDECY"}
-    # Avoid double-counting C-terminal D/E
-    if last in ["D", "E"]:
-        counts[last] = max(0, counts[last]-1)
-
-    # Positive: K, R, H + Nterm
-    pos_groups = [(pKa_fixed[aa], counts[aa]) for aa in "KRH" if counts[aa] > 0]
-    pos_groups.append((Nterm, 1))
-    # Negative: D, E, C, Y + Cterm
-    neg_groups = [(pKa_fixed[aa], counts[aa]) for aa in "DECY" if counts[aa] > 0]
-    neg_groups.append((Cterm, 1))
-
-    def net_charge(ph):
-        pos = sum(c / (1 + 10**(ph - pk)) for pk, c in pos_groups)
-        neg = sum(c / (1 + 10**(pk - ph)) for pk, c in neg_groups)
-        return pos - neg
-
-    def bisect(low, high):
-        mid = (low + high)/2
-        charge = net_charge(mid)
-        if high - low < epsilon:
-            return mid
-        if charge > 0:
-            return bisect(mid, high)
+import argparse
+from functools import partial
+from itertools import chain
+from protlib import COMPRESSION_SUFFIXES, SEQUENCE_COLUMNS, clean_sequence, open_input, open_output, output_base
+from protbatch import blocks, charge_rows, map_ordered
+from protcache import ResultCache, timed_metric_rows
+from protcluster import Clusterer
+from protcolumns import FORMATS, ColumnWriter, columnar_path
+from protmotifs import MotifScanner, read_motifs
+from prottimer import NO_TIMER, StageTimer
+
+def row_key(fields):
+    """
+    How a row is matched against the previous output: its text as csv.writer
+    writes it when no field needs quoting (nearly always), else its fields.
+    """
+    if any(c in field for field in fields for c in ',"\r\n'):
+        return tuple(fields)
+    return ",".join(fields)
+
+
+def iter_rows(f):
+    """Yield (row_key, fields) for each row of a CSV, only using the csv module for lines with quotes."""
+    lines = iter(f)
+    for line in lines:
+        if '"' not in line:
+            text = line.rstrip("\r\n")
+            yield text, text.split(",")
         else:
-            return bisect(low, mid)
-
-    return round(bisect(4.0, 12.0), 2)
-
-
-def extinction_coefficient(seq):
-    return (seq.count("W") * aa_extinction["W"] + seq.count("Y") * aa_extinction["Y"] + (seq.count("C") // 2) * aa_extinction["C"]) / (sum(aa_weights[aa] for aa in seq) - (len(seq) - 1) * 18.01528)
-
-def instability_index(seq):
-    score = 0
-    for i in range(len(seq) - 1):
-        score += DIWV.get(seq[i], {}).get(seq[i+1], 0)
-    return (10.0 / len(seq)) * score
-
-def aliphatic_index(seq):
-    a, b = 2.9, 3.9
-    total = len(seq)
-    ai = (seq.count("A") + a * seq.count("V") + b * (seq.count("I") + seq.count("L"))) / total * 100
-    return ai
-
-def half_life(seq):
-    nterm = seq[0]
-    if nterm in ["A", "G", "M", "S", "T", "V"]:
-        return ">30 hours"
-    elif nterm in ["I", "L", "N", "Q", "C"]:
-        return "10 hours"
-    elif nterm in ["R", "K", "H"]:
-        return "2 minutes"
-    elif nterm in ["F", "Y", "W"]:
-        return "2 minutes"
-    elif nterm in ["D", "E"]:
-        return "3 minutes"
-    else:
-        return "Unknown"
-
-if len(sys.argv) != 2:
-    print("Usage: python protparam_csv.py <input_csv>")
-    sys.exit(1)
-
-input_csv = sys.argv[1]
-output_csv = input_csv.rsplit(".", 1)[0] + "_protparam.csv"
-
-sequence_columns = ["sequences", "sequence_alignment_aa", "VHH", "sequence", "Sequences", "Sequence", "AA seq", "aa seq", "AA Seq", "aa Seq", "AA seq (inc signal peptide)","Aaseq (mat protein only)"]
-
-with open(input_csv, newline='') as infile:
-    reader = csv.DictReader(infile)
-
-    # Detect which column to use
-    seq_col = next((col for col in sequence_columns if col in reader.fieldnames), None)
-    if seq_col is None:
-        print(f"Error: input CSV must have one of these columns: {sequence_columns}")
+            # The reader pulls any further lines of a multi-line field from the same iterator
+            fields = next(csv.reader(chain([line], lines)))
+            yield row_key(fields), fields
+
+
+def read_previous(output_csv, fieldnames, width, groups):
+    """
+    Index an earlier _protparam.csv as {row_key of its input columns: line},
+    keeping each line as text so reused rows are copied without being parsed
+    (lines with quotes are kept as their fields). Also returns where each group
+    of calculated columns is, None for a group it doesn't have (e.g. a
+    --charge-at that wasn't asked for last time), and its header.
+    """
+    previous = {}
+    with open_input(output_csv, newline='') as f:
+        lines = iter(f)
+        header = next(csv.reader(lines), None)
+        # The input columns and the cleaned sequence come first in every output
+        if header is None or header[:width + 1] != fieldnames[:width + 1]:
+            print(f"Warning: {output_csv} was not made from this input, recalculating everything")
+            return {}, None, None
+        index = {name: i for i, name in enumerate(header)}
+        positions = [[index[c] for c in group] if all(c in index for c in group) else None for group in groups]
+        # Everything after the input columns is calculated, split off from the right
+        calculated = len(header) - width
+        for line in lines:
+            if '"' not in line:
+                parts = line.rsplit(",", calculated)
+                if len(parts) > calculated:
+                    previous[parts[0]] = line if line.endswith("\n") else line + "\r\n"
+            else:
+                fields = next(csv.reader(chain([line], lines)))
+                previous[row_key(fields[:width])] = fields
+    return previous, positions, header
+
+
+def fields_of(old):
+    """Fields of a line kept by read_previous."""
+    return old.rstrip("\r\n").split(",") if isinstance(old, str) else old
+
+
+def typed_metrics(values):
+    """Metric values read back from the CSV as the types metric_rows returns."""
+    length, *numbers, half_life = values
+    return [int(length)] + [float(x) for x in numbers] + [half_life]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calculate ProtParam values for every row of a CSV file.")
+    parser.add_argument("input_csv")
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes to spread blocks over (default 1)")
+    parser.add_argument("--cache", help="SQLite file to keep results in between runs")
+    parser.add_argument("--memo-size", type=int, default=100000, help="distinct sequences remembered in memory (default 100000)")
+    parser.add_argument("--incremental", action="store_true", help="reuse rows from an existing output file, only calculating new or changed sequences")
+    parser.add_argument("--compress", choices=sorted(COMPRESSION_SUFFIXES), help="compress the output CSV")
+    parser.add_argument("--cluster", type=float, metavar="IDENTITY", help="group sequences of the same length with at least this fraction of identical positions, e.g. 0.9")
+    parser.add_argument("--representatives-only", action="store_true", help="with --cluster, only calculate metrics for the first sequence of each cluster")
+    parser.add_argument("--columnar", choices=FORMATS, help="also write typed columns as .npy files or Parquet")
+    parser.add_argument("--charge-at", type=float, action="append", default=[], metavar="PH", help="add a net charge column at this pH (can be repeated)")
+    parser.add_argument("--liabilities", action="store_true", help="add count and position columns for deamidation, isomerization, glycosylation and oxidation motifs")
+    parser.add_argument("--motifs", help="file of 'name pattern' lines to scan for instead of the default liabilities (implies --liabilities)")
+    parser.add_argument("--profile", action="store_true", help="time each stage and print a summary at the end")
+    parser.add_argument("--profile-json", help="also save the --profile report to this JSON file")
+    args = parser.parse_args(argv)
+
+    clusterer = None
+    if args.cluster is not None:
+        try:
+            clusterer = Clusterer(args.cluster)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    if args.representatives_only and clusterer is None:
+        print("Error: --representatives-only needs --cluster")
+        sys.exit(1)
+    if args.representatives_only and args.columnar:
+        print("Error: --representatives-only leaves gaps that --columnar can't store")
         sys.exit(1)
 
-    fieldnames = reader.fieldnames + [
-        f"{seq_col}_mod", "Length", "MW (kDa)", "pI",
-        "Extinction_Coefficient", "Instability_Index",
-        "Aliphatic_Index", "Half_life"
-    ]
-
-    with open(output_csv, 'w', newline='') as outfile:
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for row in reader:
-            # Clean sequence and append VSS only if needed
-            seq = row[seq_col].replace(" ", "").strip()
-
-            row[f"{seq_col}_mod"] = seq
-
-            # Compute metrics
-            row["Length"] = len(seq)
-            row["MW (kDa)"] = round(molecular_weight(seq), 2)
-            row["pI"] = calculate_pI(seq)
-            row["Extinction_Coefficient"] = round(extinction_coefficient(seq), 3)
-            row["Instability_Index"] = round(instability_index(seq), 2)
-            row["Aliphatic_Index"] = round(aliphatic_index(seq), 2)
-            row["Half_life"] = half_life(seq)
-
-            writer.writerow(row)
-
-
-print(f"Processed CSV saved as {output_csv}")
+    scanner = None
+    if args.liabilities or args.motifs:
+        try:
+            scanner = MotifScanner(read_motifs(args.motifs) if args.motifs else None)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    profiling = args.profile or bool(args.profile_json)
+    timer = StageTimer() if profiling else NO_TIMER
+    worker = partial(timed_metric_rows, profile=profiling)
+
+    input_csv = args.input_csv
+    output_csv = output_base(input_csv) + "_protparam.csv" + COMPRESSION_SUFFIXES.get(args.compress, "")
+
+    columns = None
+    if args.columnar:
+        try:
+            columns = ColumnWriter(columnar_path(output_base(input_csv), args.columnar), args.columnar)
+        except ImportError as e:
+            print(f"Error: --columnar {args.columnar} needs {e.name} installed")
+            sys.exit(1)
+
+    # Compressed input is decompressed on a background thread as it is read
+    with open_input(input_csv, newline='') as infile:
+        rows = iter_rows(infile)
+        header = next(rows, (None, []))[1]
+        width = len(header)
+
+        # Detect which column to use
+        seq_col = next((col for col in SEQUENCE_COLUMNS if col in header), None)
+        if seq_col is None:
+            print(f"Error: input CSV must have one of these columns: {SEQUENCE_COLUMNS}")
+            sys.exit(1)
+        seq_index = header.index(seq_col)
+
+        metric_columns = [
+            "Length", "MW (kDa)", "pI",
+            "Extinction_Coefficient", "Instability_Index",
+            "Aliphatic_Index", "Half_life"
+        ]
+        charge_columns = [f"Charge_pH_{ph:g}" for ph in args.charge_at]
+        motif_columns = scanner.columns("_") if scanner else []
+        cluster_columns = ["Cluster_ID", "Cluster_Representative"] if clusterer else []
+        fieldnames = header + [f"{seq_col}_mod"] + cluster_columns + metric_columns + charge_columns + motif_columns
+        blank = [""] * (len(metric_columns) + len(charge_columns) + len(motif_columns))
+
+        previous, positions, previous_header = {}, None, None
+        if args.incremental and os.path.exists(output_csv):
+            with timer.stage("previous"):
+                previous, positions, previous_header = read_previous(
+                    output_csv, fieldnames, width, [metric_columns, charge_columns, motif_columns])
+        metric_at, charge_at, motif_at = positions or (None, None, None)
+        # With the same columns as last time a reused line is written out exactly as it was,
+        # except that clusters depend on the whole file and are always redone
+        same_columns = previous_header == fieldnames and clusterer is None
+        # Only a --representatives-only run leaves rows without metrics
+        gaps = bool(previous_header) and "Cluster_ID" in previous_header
+        reused = 0
+        total = 0
+
+        def records(rows):
+            for number, (key, fields) in enumerate(rows, 2):
+                if not key:
+                    continue
+                if len(fields) > width:
+                    raise ValueError(f"{input_csv} line {number} has more fields than the header")
+                if len(fields) < width:
+                    fields = fields + [""] * (width - len(fields))
+                    key = row_key(fields)
+                yield key, fields
+
+        # Write next to the old output and swap at the end, it is still being read from
+        write_to = output_csv + ".tmp" if previous else output_csv
+        with open_output(write_to, args.compress) as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(fieldnames)
+
+            cache = ResultCache(args.memo_size, args.cache)
+
+            def prepare(block):
+                with timer.stage("cache"):
+                    # Rows already in the previous output are copied through, matched on their text
+                    kept = [previous.get(key) for key, _ in block] if previous else [None] * len(block)
+                    if gaps:
+                        # A cluster member left blank by --representatives-only has nothing to reuse
+                        kept = [None if old is None or fields_of(old)[metric_at[0]] == "" else old for old in kept]
+                with timer.stage("clean"):
+                    # Clean sequence and append VSS only if needed, lines copied as they are need nothing
+                    seqs = [None if old is not None and same_columns else clean_sequence(fields[seq_index])
+                            for (_, fields), old in zip(block, kept)]
+                clusters = None
+                calculate = [True] * len(seqs)
+                if clusterer:
+                    with timer.stage("cluster"):
+                        # Cluster number and row number of its representative, both 1-based
+                        first_row = clusterer.seen + 1
+                        clusters = [(c + 1, clusterer.representatives[c][0]) for c in clusterer.assign(seqs)]
+                    if args.representatives_only:
+                        calculate = [rep_row == first_row + i for i, (_, rep_row) in enumerate(clusters)]
+                        kept = [old if wanted else None for old, wanted in zip(kept, calculate)]
+                with timer.stage("cache"):
+                    # Only new rows, or columns the previous output lacks, are calculated
+                    metric_todo = [seq for seq, old, wanted in zip(seqs, kept, calculate)
+                                   if wanted and (old is None or metric_at is None)]
+                    found, missing = cache.split(metric_todo)
+                return (block, seqs, clusters, calculate, kept, metric_todo, found, missing), missing
+
+            # Compute metrics a whole block at a time, results come back in input order
+            for (block, seqs, clusters, calculate, kept, metric_todo, found, missing), result in map_ordered(worker, map(prepare, timer.timed("read", blocks(records(rows)))), args.jobs):
+                timer.add(result[2])
+                with timer.stage("cache"):
+                    metrics = iter(cache.merge(metric_todo, found, missing, result))
+                reused += len(kept) - kept.count(None)
+                with timer.stage("charge"):
+                    charges = iter(charge_rows([seq for seq, old, wanted in zip(seqs, kept, calculate)
+                                                if wanted and (old is None or charge_at is None)], args.charge_at))
+                with timer.stage("liabilities"):
+                    todo = [seq for seq, old, wanted in zip(seqs, kept, calculate) if wanted and (old is None or motif_at is None)]
+                    liabilities = iter(scanner.rows(todo) if scanner else [[]] * len(todo))
+                with timer.stage("write"):
+                    typed = []
+                    for i, ((_, fields), seq, old) in enumerate(zip(block, seqs, kept)):
+                        if old is not None and same_columns:
+                            if isinstance(old, str):
+                                outfile.write(old)
+                            else:
+                                writer.writerow(old)
+                            if columns:
+                                old = fields_of(old)
+                                typed.append(typed_metrics([old[j] for j in metric_at]))
+                            continue
+                        out = fields + [seq] + (list(clusters[i]) if clusters else [])
+                        # Rows left out by --representatives-only keep their metric columns empty
+                        if not calculate[i]:
+                            writer.writerow(out + blank)
+                            continue
+                        if old is not None:
+                            old = fields_of(old)
+                        if old is None or metric_at is None:
+                            values = next(metrics)
+                            typed.append(values)
+                        else:
+                            values = [old[j] for j in metric_at]
+                            if columns:
+                                typed.append(typed_metrics(values))
+                        out += values
+                        out += next(charges) if old is None or charge_at is None else [old[j] for j in charge_at]
+                        out += next(liabilities) if old is None or motif_at is None else [old[j] for j in motif_at]
+                        writer.writerow(out)
+                    if columns:
+                        columns.add(typed)
+                total += len(seqs)
+            cache.close()
+
+    if write_to != output_csv:
+        os.replace(write_to, output_csv)
+        print(f"Incremental: {reused} rows copied from the previous output")
+    print(cache.report())
+    print(f"Processed CSV saved as {output_csv}")
+    if columns:
+        with timer.stage("write"):
+            columns.close()
+        print(f"Columns saved to {columns.path}")
+    if clusterer:
+        print(f"Clusters: {len(clusterer.representatives)} from {total} rows at {args.cluster:g} identity")
+    if profiling:
+        print(timer.summary(total, args.profile_json, input=input_csv, jobs=args.jobs))
+
+if __name__ == "__main__":
+    main()
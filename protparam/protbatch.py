@@ -0,0 +1,285 @@
+"""
+Block-at-a-time ProtParam metrics.
+
+Sequences are encoded into one residue-code array, a composition matrix is
+built once per block and every metric is derived from it with array maths.
+Results are identical to the per-sequence functions in protlib.py, which are
+used as a fallback when numpy is not installed.
+"""
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from protlib import (pKa_fixed, Nterm_pKa, Cterm_default, pK_cterm, aa_weights, aa_extinction,
+                     DIWV, molecular_weight, calculate_pI, net_charge, extinction_coefficient,
+                     instability_index, aliphatic_index, half_life)
+from prottimer import NO_TIMER
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BLOCK_SIZE = 4096
+
+AA_ORDER = "ACDEFGHIKLMNPQRSTVWY"
+UNKNOWN = len(AA_ORDER)
+AA_INDEX = {aa: i for i, aa in enumerate(AA_ORDER)}
+
+# sum() of floats switched to compensated summation in Python 3.12
+_COMPENSATED_SUM = sys.version_info >= (3, 12)
+
+if np is not None:
+    RESIDUE_CODES = np.full(256, UNKNOWN, dtype=np.uint8)
+    for _aa, _i in AA_INDEX.items():
+        RESIDUE_CODES[ord(_aa)] = _i
+
+    RESIDUE_WEIGHTS = np.array([aa_weights[aa] for aa in AA_ORDER] + [np.nan])
+
+    # DIWV as a 21x21 matrix, unknown residues score 0 like DIWV.get(..., 0)
+    DIWV_MATRIX = np.zeros((UNKNOWN + 1, UNKNOWN + 1))
+    for _a, _row in DIWV.items():
+        for _b, _score in _row.items():
+            DIWV_MATRIX[AA_INDEX[_a], AA_INDEX[_b]] = _score
+
+    # Terminal pKa looked up by residue code
+    _NTERM_PKA = np.array([Nterm_pKa.get(aa, 7.5) for aa in AA_ORDER] + [7.5])
+    _CTERM_PKA = np.array([pK_cterm.get(aa, Cterm_default) for aa in AA_ORDER] + [Cterm_default])
+
+    HALF_LIFE_BY_CODE = np.array([half_life(aa) for aa in AA_ORDER] + ["Unknown"], dtype=object)
+
+
+def blocks(iterable, size=BLOCK_SIZE):
+    """Yield lists of up to `size` items from any iterable."""
+    it = iter(iterable)
+    while True:
+        block = list(islice(it, size))
+        if not block:
+            return
+        yield block
+
+
+def map_ordered(func, pairs, jobs=1):
+    """
+    Yield (context, func(payload)) for each (context, payload) pair, in input order.
+
+    With jobs > 1 the payloads run in a process pool. At most 2 * jobs are in
+    flight at once, so reading the input waits for the workers to catch up.
+    """
+    if jobs <= 1:
+        for context, payload in pairs:
+            yield context, func(payload)
+        return
+
+    with ProcessPoolExecutor(jobs) as pool:
+        pending = deque()
+        for context, payload in pairs:
+            pending.append((context, pool.submit(func, payload)))
+            if len(pending) >= 2 * jobs:
+                context, future = pending.popleft()
+                yield context, future.result()
+        while pending:
+            context, future = pending.popleft()
+            yield context, future.result()
+
+
+def encode(seqs):
+    """Encode sequences into (codes, offsets, lengths) arrays."""
+    buf = np.frombuffer("".join(seqs).encode("ascii", "replace"), dtype=np.uint8)
+    codes = RESIDUE_CODES[buf]
+    lengths = np.fromiter((len(s) for s in seqs), dtype=np.int64, count=len(seqs))
+    offsets = np.zeros(len(seqs), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+
+    unknown = np.flatnonzero(codes == UNKNOWN)
+    if unknown.size:
+        raise KeyError(chr(buf[unknown[0]]))
+    if (lengths == 0).any():
+        raise ValueError("Empty sequence in block")
+    return codes, offsets, lengths
+
+
+def composition(codes, lengths):
+    """Return an (n_sequences, 21) matrix of residue counts."""
+    n = len(lengths)
+    seq_ids = np.repeat(np.arange(n), lengths)
+    counts = np.bincount(seq_ids * (UNKNOWN + 1) + codes, minlength=n * (UNKNOWN + 1))
+    return counts.reshape(n, UNKNOWN + 1)
+
+
+def _accumulate(s, x, comp=None):
+    """Return s + x, updating the Neumaier compensation array in place if given."""
+    t = s + x
+    if comp is not None:
+        comp += np.where(np.abs(s) >= np.abs(x), (s - t) + x, (x - t) + s)
+    return t
+
+
+def ordered_sum(values, offsets, lengths, compensated=False):
+    """
+    Sum each sequence's slice of `values` from left to right.
+
+    Rows are walked one position at a time across the whole block so the float
+    rounding matches a Python loop (or sum() when compensated) bit for bit.
+    """
+    order = np.argsort(-lengths, kind="stable")
+    starts = offsets[order]
+    neg_lengths = -lengths[order]
+    total = np.zeros(len(lengths))
+    comp = np.zeros(len(lengths))
+
+    for j in range(int(-neg_lengths[0]) if len(lengths) else 0):
+        active = np.searchsorted(neg_lengths, -j, side="left")
+        total[:active] = _accumulate(total[:active], values[starts[:active] + j],
+                                     comp[:active] if compensated else None)
+
+    result = np.empty_like(total)
+    result[order] = total + comp
+    return result
+
+
+def _charge_groups(counts, first, last):
+    """Block version of charge_groups, with one count or pKa per sequence in each group."""
+    col = AA_INDEX
+    counts = counts.copy()
+    for aa in pK_cterm:
+        counts[last == col[aa], col[aa]] -= 1
+
+    # Same group order as charge_groups, empty groups add exactly 0.0
+    pos_groups = [(pKa_fixed[aa], counts[:, col[aa]]) for aa in "KRH"]
+    pos_groups.append((_NTERM_PKA[first], 1))
+    neg_groups = [(pKa_fixed[aa], counts[:, col[aa]]) for aa in "DECY"]
+    neg_groups.append((_CTERM_PKA[last], 1))
+    return pos_groups, neg_groups
+
+
+def _net_charge(pos_groups, neg_groups, ph):
+    """Net charge for the groups at ph, broadcasting like any numpy expression."""
+    def group_sum(groups, charge_of):
+        total = comp = None
+        for pk, c in groups:
+            x = c / (1 + charge_of(pk))
+            if total is None:
+                total = np.zeros(x.shape)
+                comp = np.zeros(x.shape) if _COMPENSATED_SUM else None
+            total = _accumulate(total, x, comp)
+        return total if comp is None else total + comp
+
+    return (group_sum(pos_groups, lambda pk: 10 ** (ph - pk))
+            - group_sum(neg_groups, lambda pk: 10 ** (pk - ph)))
+
+
+def batch_net_charge(seqs, phs):
+    """Net charge of every sequence at every pH, as a (sequences, pH points) matrix."""
+    codes, offsets, lengths = encode(seqs)
+    counts = composition(codes, lengths)
+    pos_groups, neg_groups = _charge_groups(counts, codes[offsets], codes[offsets + lengths - 1])
+    # Sequences down the rows, pH across the columns
+    column = lambda groups: [(np.reshape(pk, (-1, 1)), np.reshape(c, (-1, 1))) for pk, c in groups]
+    return _net_charge(column(pos_groups), column(neg_groups), np.asarray(phs, dtype=float).reshape(1, -1))
+
+
+def batch_pI(counts, first, last, epsilon=0.0001):
+    """
+    Solve the pI of every sequence in a block at once.
+
+    Takes the composition matrix and the codes of the first and last residues,
+    and bisects all sequences together over 4.0-12.0. Each step repeats the
+    arithmetic of calculate_pI, so the unrounded results are identical.
+    """
+    pos_groups, neg_groups = _charge_groups(counts, first, last)
+
+    # Every bracket starts 8.0 wide and is halved exactly, so all sequences
+    # reach epsilon on the same step
+    low = np.full(len(first), 4.0)
+    high = np.full(len(first), 12.0)
+    while True:
+        mid = (low + high) / 2
+        if (high - low < epsilon).all():
+            return mid
+        charge = _net_charge(pos_groups, neg_groups, mid)
+        low = np.where(charge > 0, mid, low)
+        high = np.where(charge > 0, high, mid)
+
+
+def batch_metrics(seqs, timer=NO_TIMER):
+    """Compute unrounded metric arrays for a list of cleaned sequences."""
+    with timer.stage("encode"):
+        codes, offsets, lengths = encode(seqs)
+        counts = composition(codes, lengths)
+    col = AA_INDEX
+
+    with timer.stage("MW"):
+        residue_mass = ordered_sum(RESIDUE_WEIGHTS[codes], offsets, lengths, _COMPENSATED_SUM)
+        mass = residue_mass - (lengths - 1) * 18.01528
+
+    with timer.stage("extinction"):
+        extinction = (counts[:, col["W"]] * aa_extinction["W"]
+                      + counts[:, col["Y"]] * aa_extinction["Y"]
+                      + (counts[:, col["C"]] // 2) * aa_extinction["C"]) / mass
+
+    with timer.stage("instability"):
+        # Dipeptide scores, the last residue of each sequence pairs with nothing
+        pair_scores = np.zeros(len(codes))
+        pair_scores[:-1] = DIWV_MATRIX[codes[:-1], codes[1:]]
+        instability = (10.0 / lengths) * ordered_sum(pair_scores, offsets, lengths - 1)
+
+    with timer.stage("aliphatic"):
+        a, b = 2.9, 3.9
+        aliphatic = (counts[:, col["A"]] + a * counts[:, col["V"]]
+                     + b * (counts[:, col["I"]] + counts[:, col["L"]])) / lengths * 100
+
+    with timer.stage("pI"):
+        pI = batch_pI(counts, codes[offsets], codes[offsets + lengths - 1])
+
+    with timer.stage("half-life"):
+        half_lives = HALF_LIFE_BY_CODE[codes[offsets]]
+
+    return {
+        "Length": lengths,
+        "MW": mass / 1000,
+        "pI": pI,
+        "Extinction": extinction,
+        "Instability": instability,
+        "Aliphatic": aliphatic,
+        "Half-life": half_lives,
+    }
+
+
+def charge_rows(seqs, phs):
+    """Net charge at each pH for every sequence, rounded to 2 places like pI."""
+    if not seqs or not phs:
+        return [[] for _ in seqs]
+    if np is None:
+        return [[round(net_charge(seq, ph), 2) for ph in phs] for seq in seqs]
+    return [[round(charge, 2) for charge in row] for row in batch_net_charge(seqs, phs).tolist()]
+
+
+def metric_rows(seqs, timer=NO_TIMER):
+    """
+    Return one [Length, MW, pI, Extinction, Instability, Aliphatic, Half-life]
+    row per sequence, rounded the same way as the CSV writers.
+    """
+    if not seqs:
+        return []
+    if np is None:
+        columns = []
+        for name, func in [("length", len),
+                           ("MW", lambda seq: round(molecular_weight(seq), 2)),
+                           ("pI", calculate_pI),
+                           ("extinction", lambda seq: round(extinction_coefficient(seq), 3)),
+                           ("instability", lambda seq: round(instability_index(seq), 2)),
+                           ("aliphatic", lambda seq: round(aliphatic_index(seq), 2)),
+                           ("half-life", half_life)]:
+            with timer.stage(name):
+                columns.append([func(seq) for seq in seqs])
+        return [list(row) for row in zip(*columns)]
+
+    m = batch_metrics(seqs, timer)
+    with timer.stage("round"):
+        return [[length, round(mw, 2), round(pI, 2), round(ext, 3), round(ii, 2), round(ai, 2), hl]
+                for length, mw, pI, ext, ii, ai, hl in zip(
+                    m["Length"].tolist(), m["MW"].tolist(), m["pI"].tolist(),
+                    m["Extinction"].tolist(), m["Instability"].tolist(),
+                    m["Aliphatic"].tolist(), m["Half-life"].tolist())]
@@ -0,0 +1,127 @@
+"""
+Result caching for ProtParam runs.
+
+Rows are memoised in memory by cleaned sequence (least recently used rows are
+evicted first) and can optionally be kept in a SQLite file between runs. The
+SQLite key is a hash of the sequence plus a version of the parameter tables,
+so changing a table never returns stale numbers.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+
+from protlib import pKa_fixed, Nterm_pKa, Cterm_default, pK_cterm, aa_weights, aa_extinction, DIWV
+from protbatch import metric_rows
+from prottimer import NO_TIMER, StageTimer
+
+# Bump when a metric calculation changes without a table changing
+CACHE_FORMAT = 1
+
+PARAMS_VERSION = hashlib.sha1(repr((
+    CACHE_FORMAT, pKa_fixed, Nterm_pKa, Cterm_default, pK_cterm, aa_weights, aa_extinction, DIWV
+)).encode()).hexdigest()[:12]
+
+
+def sequence_hash(seq):
+    return hashlib.sha1(seq.encode()).hexdigest()
+
+
+def timed_metric_rows(seqs, profile=False):
+    """
+    metric_rows plus the seconds it took and, when profiling, the time per stage,
+    so workers can report back how long they spent.
+    """
+    timer = StageTimer() if profile else NO_TIMER
+    start = time.perf_counter()
+    rows = metric_rows(seqs, timer)
+    return rows, time.perf_counter() - start, timer.seconds if profile else {}
+
+
+class ResultCache:
+    def __init__(self, maxsize=100000, path=None):
+        self.maxsize = maxsize
+        self.memo = OrderedDict()
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS results ("
+                            "hash TEXT, version TEXT, row TEXT, seconds REAL, PRIMARY KEY (hash, version))")
+
+        self.memo_hits = 0
+        self.disk_hits = 0
+        self.computed = 0
+        self.compute_seconds = 0.0
+        self.disk_seconds = 0.0
+
+    def split(self, seqs):
+        """Return ({seq: row} already known, [unique seqs still to compute])."""
+        found = {}
+        unique = list(dict.fromkeys(seqs))
+        for seq in unique:
+            if seq in self.memo:
+                self.memo.move_to_end(seq)
+                found[seq] = self.memo[seq]
+        unknown = [seq for seq in unique if seq not in found]
+
+        if self.db is not None and unknown:
+            by_hash = {sequence_hash(seq): seq for seq in unknown}
+            hashes = list(by_hash)
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                query = ("SELECT hash, row, seconds FROM results WHERE version = ? AND hash IN (%s)"
+                         % ",".join("?" * len(chunk)))
+                for h, row, seconds in self.db.execute(query, [PARAMS_VERSION] + chunk):
+                    seq = by_hash[h]
+                    self.disk_seconds += seconds
+                    found[seq] = json.loads(row)
+                    self._remember(seq, found[seq])
+
+        missing = [seq for seq in unknown if seq not in found]
+        # Repeats within the block count as memory hits
+        self.memo_hits += len(seqs) - len(unknown)
+        self.disk_hits += len(unknown) - len(missing)
+        return found, missing
+
+    def merge(self, seqs, found, missing, result):
+        """Store freshly computed rows and return the full list of rows for seqs."""
+        rows, seconds, _ = result
+        self.computed += len(missing)
+        self.compute_seconds += seconds
+        for seq, row in zip(missing, rows):
+            found[seq] = row
+            self._remember(seq, row)
+        if self.db is not None and missing:
+            per_seq = seconds / len(missing)
+            self.db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                [(sequence_hash(seq), PARAMS_VERSION, json.dumps(row), per_seq)
+                                 for seq, row in zip(missing, rows)])
+            self.db.commit()
+        return [found[seq] for seq in seqs]
+
+    def _remember(self, seq, row):
+        if self.maxsize <= 0:
+            return
+        self.memo[seq] = row
+        self.memo.move_to_end(seq)
+        if len(self.memo) > self.maxsize:
+            self.memo.popitem(last=False)
+
+    def report(self):
+        hits = self.memo_hits + self.disk_hits
+        total = hits + self.computed
+        if not total:
+            return "Cache: no sequences processed"
+        # Disk hits know what they originally cost, memory hits use the average
+        known = self.computed + self.disk_hits
+        per_seq = (self.compute_seconds + self.disk_seconds) / known if known else 0.0
+        saved = self.disk_seconds + self.memo_hits * per_seq
+        return (f"Cache: {hits}/{total} sequences reused ({100 * hits / total:.1f}%, "
+                f"{self.memo_hits} in memory, {self.disk_hits} on disk), "
+                f"~{saved:.1f} s of calculation saved")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
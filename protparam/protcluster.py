@@ -0,0 +1,121 @@
+"""
+Greedy near-duplicate clustering of sequence libraries.
+
+Sequences are clustered in input order: each one joins the first cluster whose
+representative it matches at the identity threshold, otherwise it starts a new
+cluster and becomes its representative. As in clonotype definitions, identity
+is the fraction of identical positions, so only sequences of the same length
+can share a cluster.
+
+Instead of comparing against every representative, candidates come from a
+MinHash index of k-mers. Each representative's signature is split into bands,
+and only the few representatives of the same length sharing the most bands are
+checked. Every bucket keeps its most recent representatives only, so the cost
+per sequence stays flat on libraries of millions. The price is that a sequence
+whose match is not among those few starts a cluster of its own.
+"""
+import random
+from collections import Counter, deque
+from operator import ne
+
+from protbatch import AA_INDEX, RESIDUE_CODES, UNKNOWN, np
+
+# Hash values are taken modulo this prime
+_PRIME = (1 << 31) - 1
+
+
+def identity(a, b):
+    """Fraction of positions where two sequences of the same length agree, 0 if the lengths differ."""
+    if len(a) != len(b) or not a:
+        return 0.0
+    return 1 - sum(map(ne, a, b)) / len(a)
+
+
+class Clusterer:
+    def __init__(self, threshold=0.9, k=5, bands=20, rows=3, checks=10, bucket_size=50, seed=0):
+        if not 0 < threshold <= 1:
+            raise ValueError("Identity threshold must be between 0 and 1")
+        self.threshold = threshold
+        self.k = k
+        self.bands = bands
+        self.rows = rows
+        self.checks = checks
+        self.bucket_size = bucket_size
+        rng = random.Random(seed)
+        self._a = [rng.randrange(1, _PRIME) for _ in range(bands * rows)]
+        self._b = [rng.randrange(0, _PRIME) for _ in range(bands * rows)]
+
+        self.representatives = []  # (row number, sequence) of each cluster
+        self.seen = 0
+        self._exact = {}
+        self._buckets = {}
+
+    def _kmers(self, seq):
+        """Base-21 integer of each k-mer in seq."""
+        codes = [AA_INDEX.get(aa, UNKNOWN) for aa in seq]
+        kmers = set()
+        for i in range(len(codes) - self.k + 1):
+            value = 0
+            for code in codes[i:i + self.k]:
+                value = value * (UNKNOWN + 1) + code
+            kmers.add(value)
+        return kmers
+
+    def signatures(self, seqs):
+        """Return one MinHash signature (bands * rows values) per sequence, None if shorter than k."""
+        if np is None:
+            signatures = []
+            for seq in seqs:
+                kmers = self._kmers(seq)
+                signatures.append([min((a * x + b) % _PRIME for x in kmers) for a, b in zip(self._a, self._b)]
+                                  if kmers else None)
+            return signatures
+
+        n = len(seqs)
+        codes = RESIDUE_CODES[np.frombuffer("".join(seqs).encode("ascii", "replace"), dtype=np.uint8)].astype(np.int64)
+        lengths = np.fromiter((len(s) for s in seqs), dtype=np.int64, count=n)
+        counts = np.maximum(lengths - self.k + 1, 0)
+        if not counts.any():
+            return [None] * n
+
+        # k-mer starting at every residue, kept if the whole k-mer is in the same sequence
+        values = codes[:len(codes) - self.k + 1].copy()
+        for j in range(1, self.k):
+            values = values * (UNKNOWN + 1) + codes[j:len(codes) - self.k + 1 + j]
+        seq_ids = np.repeat(np.arange(n), lengths)[:len(values)]
+        position = np.arange(len(values)) - np.repeat(np.cumsum(lengths) - lengths, lengths)[:len(values)]
+        kmers = values[position <= lengths[seq_ids] - self.k]
+
+        long_enough = np.flatnonzero(counts)
+        bounds = (np.cumsum(counts) - counts)[long_enough]
+        mins = np.empty((len(long_enough), self.bands * self.rows), dtype=np.int64)
+        for h, (a, b) in enumerate(zip(self._a, self._b)):
+            mins[:, h] = np.minimum.reduceat((a * kmers + b) % _PRIME, bounds)
+        signatures = [None] * n
+        for i, signature in zip(long_enough.tolist(), mins.tolist()):
+            signatures[i] = signature
+        return signatures
+
+    def assign(self, seqs):
+        """Return the 0-based cluster of each sequence, adding new clusters as needed."""
+        clusters = []
+        for seq, signature in zip(seqs, self.signatures(seqs)):
+            self.seen += 1
+            cluster = self._exact.get(seq)
+            keys = []
+            if cluster is None and signature is not None:
+                keys = [(len(seq), band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+                        for band in range(self.bands)]
+                shared = Counter(c for key in keys for c in self._buckets.get(key, ()))
+                for candidate, _ in shared.most_common(self.checks):
+                    if identity(seq, self.representatives[candidate][1]) >= self.threshold:
+                        cluster = candidate
+                        break
+            if cluster is None:
+                cluster = len(self.representatives)
+                self.representatives.append((self.seen, seq))
+                self._exact[seq] = cluster
+                for key in keys:
+                    self._buckets.setdefault(key, deque(maxlen=self.bucket_size)).append(cluster)
+            clusters.append(cluster)
+        return clusters
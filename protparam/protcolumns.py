@@ -0,0 +1,85 @@
+"""
+Columnar output for ProtParam results, so downstream tools don't re-parse CSV text.
+
+"npy" writes a directory with one .npy file per column, which can be memory-mapped
+with load_columns (or np.load(..., mmap_mode="r")). "parquet" writes a single
+Parquet file and needs pyarrow. Values are the same rounded numbers as the CSV,
+in the same row order.
+"""
+import os
+from array import array
+
+from protlib import COLUMNS
+
+FORMATS = ("npy", "parquet")
+
+# File-safe name and array typecode for each metric, None for text columns
+COLUMN_TYPES = {
+    "Length": ("length", "q"),
+    "MW (kDa)": ("mw_kda", "d"),
+    "pI": ("pi", "d"),
+    "Extinction Coefficient": ("extinction_coefficient", "d"),
+    "Instability Index": ("instability_index", "d"),
+    "Aliphatic Index": ("aliphatic_index", "d"),
+    "Half-life": ("half_life", None),
+}
+
+
+def columnar_path(base, fmt):
+    return base + "_protparam" + (".parquet" if fmt == "parquet" else "_npy")
+
+
+class ColumnWriter:
+    def __init__(self, path, fmt, text_columns=()):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown columnar format '{fmt}', choose from {FORMATS}")
+        # Fail before any work is done if the library is missing
+        if fmt == "parquet":
+            import pyarrow  # noqa: F401
+        else:
+            import numpy  # noqa: F401
+
+        self.path = path
+        self.fmt = fmt
+        self.columns = {}
+        for name in text_columns:
+            self.columns[name] = []
+        for metric in COLUMNS:
+            name, typecode = COLUMN_TYPES[metric]
+            self.columns[name] = array(typecode) if typecode else []
+
+    def add(self, rows, **text):
+        """Append metric rows (in COLUMNS order) plus a list for each text column."""
+        for name, values in text.items():
+            self.columns[name].extend(values)
+        for metric, values in zip(COLUMNS, zip(*rows)):
+            self.columns[COLUMN_TYPES[metric][0]].extend(values)
+
+    def close(self):
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            pq.write_table(pa.table({name: list(values) if isinstance(values, array) else values
+                                     for name, values in self.columns.items()}), self.path)
+            return
+
+        import numpy as np
+        os.makedirs(self.path, exist_ok=True)
+        for name, values in self.columns.items():
+            if isinstance(values, array):
+                data = np.frombuffer(values, dtype=np.int64 if values.typecode == "q" else np.float64)
+            else:
+                data = np.array(values, dtype=str)
+            np.save(os.path.join(self.path, name + ".npy"), data)
+
+
+def load_columns(path, mmap=True):
+    """Load a columnar result as {column: array}, memory-mapped for the npy format."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+    import numpy as np
+    return {entry[:-4]: np.load(os.path.join(path, entry), mmap_mode="r" if mmap else None)
+            for entry in sorted(os.listdir(path)) if entry.endswith(".npy")}
@@ -0,0 +1,159 @@
+"""
+Precomputed property index for large sequence libraries.
+
+`build` calculates every sequence's metrics and residue composition once and
+stores them as memory-mapped .npy columns. `query` then runs range filters and
+top-k sorts over those columns without touching the original FASTA/CSV.
+
+Usage:
+    python protindex.py build <FASTA_or_CSV> [--out library.protindex] [--id-column clone]
+    python protindex.py query library.protindex --where pi=6:7.5 --where instability_index=:40 \\
+        [--sort aliphatic_index --desc] [--top 20] [--csv hits.csv]
+
+Filter keys are the metric columns (length, mw_kda, pi, extinction_coefficient,
+instability_index, aliphatic_index) or n_X for the count of residue X.
+"""
+import os
+import csv
+import sys
+import json
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from protlib import COLUMNS, iter_records, output_base
+from protbatch import AA_INDEX, blocks, composition, encode, metric_rows
+from protcache import PARAMS_VERSION
+from protcolumns import COLUMN_TYPES, ColumnWriter, load_columns
+
+NUMERIC_COLUMNS = [COLUMN_TYPES[name][0] for name in COLUMNS if COLUMN_TYPES[name][1]]
+
+
+def build_index(source, out_dir, id_column=None):
+    """Calculate and store metrics and composition for every sequence in source."""
+    columns = ColumnWriter(out_dir, "npy", ["id"])
+    counts = []
+    for block in blocks(iter_records(source, id_column)):
+        ids = [seq_id for seq_id, _ in block]
+        seqs = [seq for _, seq in block]
+        columns.add(metric_rows(seqs), id=ids)
+        codes, _, lengths = encode(seqs)
+        # 20 standard residues, lengths fit comfortably in uint16
+        counts.append(composition(codes, lengths)[:, :len(AA_INDEX)].astype(np.uint16))
+
+    columns.close()
+    rows = sum(len(c) for c in counts)
+    np.save(os.path.join(out_dir, "composition.npy"),
+            np.concatenate(counts) if counts else np.zeros((0, len(AA_INDEX)), dtype=np.uint16))
+    with open(os.path.join(out_dir, "index.json"), "w") as f:
+        json.dump({"source": os.path.abspath(source), "rows": rows, "params_version": PARAMS_VERSION,
+                   "built": datetime.now().isoformat(timespec="seconds")}, f, indent=2)
+    return rows
+
+
+class PropertyIndex:
+    def __init__(self, path):
+        self.path = path
+        self.columns = load_columns(path)
+        with open(os.path.join(path, "index.json")) as f:
+            self.info = json.load(f)
+        if self.info["params_version"] != PARAMS_VERSION:
+            print(f"Warning: {path} was built with different parameter tables, rebuild it for current values")
+
+    def __len__(self):
+        return self.info["rows"]
+
+    def column(self, name):
+        if name.startswith("n_") and name[2:] in AA_INDEX:
+            return self.columns["composition"][:, AA_INDEX[name[2:]]]
+        if name in NUMERIC_COLUMNS:
+            return self.columns[name]
+        raise KeyError(f"Unknown column '{name}', use one of {NUMERIC_COLUMNS} or n_<residue>")
+
+    def query(self, where=None, sort=None, descending=False, top=None):
+        """
+        Return row numbers matching every (low, high) range in `where`, where
+        either bound may be None. Sorted by `sort` and cut to `top` if given.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, (low, high) in (where or {}).items():
+            values = self.column(name)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        hits = np.flatnonzero(mask)
+
+        if sort is None:
+            return hits[:top] if top else hits
+        keys = self.column(sort)[hits]
+        if descending:
+            keys = -keys.astype(np.float64)
+        if top and top < len(hits):
+            # Partition first so only the top k get fully sorted
+            part = np.sort(np.argpartition(keys, top - 1)[:top])
+            return hits[part[np.argsort(keys[part], kind="stable")]]
+        return hits[np.argsort(keys, kind="stable")]
+
+    def rows(self, hits):
+        """Yield {column: value} for the given row numbers."""
+        names = ["id"] + NUMERIC_COLUMNS + ["half_life"]
+        data = {name: self.columns[name][hits].tolist() for name in names}
+        for i in range(len(hits)):
+            yield {name: data[name][i] for name in names}
+
+
+def parse_where(text):
+    """Turn 'pi=6:7.5', 'pi=:7.5' or 'pi=6:' into ('pi', (6.0, 7.5))."""
+    name, _, bounds = text.partition("=")
+    low, _, high = bounds.partition(":")
+    return name, (float(low) if low else None, float(high) if high else None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query a ProtParam property index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="calculate and store properties for a FASTA or CSV")
+    build.add_argument("source")
+    build.add_argument("--out", help="index directory (default <source>.protindex)")
+    build.add_argument("--id-column", help="CSV column to use as the ID (default row number)")
+
+    query = commands.add_parser("query", help="filter and sort an index")
+    query.add_argument("index")
+    query.add_argument("--where", action="append", default=[], help="range filter such as pi=6:7.5 or instability_index=:40")
+    query.add_argument("--sort", help="column to sort by")
+    query.add_argument("--desc", action="store_true", help="sort largest first")
+    query.add_argument("--top", type=int, help="only return this many rows")
+    query.add_argument("--csv", help="write the hits to this CSV instead of printing them")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        out_dir = args.out or output_base(args.source) + ".protindex"
+        try:
+            rows = build_index(args.source, out_dir, args.id_column)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"Indexed {rows} sequences into {out_dir}")
+        return
+
+    index = PropertyIndex(args.index)
+    try:
+        hits = index.query(dict(parse_where(w) for w in args.where), args.sort, args.desc, args.top)
+    except (KeyError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    names = ["id"] + NUMERIC_COLUMNS + ["half_life"]
+    out = open(args.csv, "w", newline="") if args.csv else sys.stdout
+    writer = csv.DictWriter(out, fieldnames=names, delimiter="," if args.csv else "\t")
+    writer.writeheader()
+    writer.writerows(index.rows(hits))
+    if args.csv:
+        out.close()
+        print(f"{len(hits)} hits saved to {args.csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""
+ProtParam tables and metric functions shared by fastaprot.py, csvprot.py and
+any other pipeline that wants the numbers in memory.
+
+Importing this module only defines the tables and functions below. The numpy
+block engine is loaded the first time compute_batch is called.
+"""
+import io
+import os
+import bz2
+import csv
+import gzip
+import lzma
+import mmap
+import queue
+import threading
+
+
+# Fixed pKa values for sidechains
+pKa_fixed = {"K": 10.0, "R": 12.0, "H": 5.98, "D": 4.05, "E": 4.45, "C": 9.0, "Y": 10.0}
+# Approx. N-terminal pKa depending on residue
+Nterm_pKa = {"A": 7.59, "M": 7.0, "S": 6.93, "P": 8.36, "T": 6.82, "V": 7.44, "E": 7.70}
+# C-terminal default pKa
+Cterm_default = 3.55
+# C-terminal corrections for D/E
+pK_cterm = {"D": 4.55, "E": 4.75}
+
+aa_weights = {
+    "A": 89.0932, "R": 174.201, "N": 132.1179, "D": 133.1027,
+    "C": 121.1582, "E": 147.1293, "Q": 146.1445, "G": 75.0666,
+    "H": 155.1546, "I": 131.1729, "L": 131.1729, "K": 146.1876,
+    "M": 149.2113, "F": 165.1891, "P": 115.1305, "S": 105.0926,
+    "T": 119.1192, "W": 204.2252, "Y": 181.1885, "V": 117.1463
+}
+
+aa_extinction = {
+    "W": 5500,
+    "Y": 1490,
+    "C": 125
+}
+
+aa_volume = {
+    "A": 88.6, "R": 173.4, "N": 114.1, "D": 111.1, "C": 108.5, "E": 138.4,
+    "Q": 143.8, "G": 60.1, "H": 153.2, "I": 166.7, "L": 166.7, "K": 168.6,
+    "M": 162.9, "F": 189.9, "P": 112.7, "S": 89.0, "T": 116.1, "W": 227.8,
+    "Y": 193.6, "V": 140.0
+}
+
+aa_ai = {"A": 71.09, "V": 99.07, "I": 100.00, "L": 97.00, "F": 100.00, "C": 50.00, "M": 60.00}
+
+# Kyte-Doolittle hydropathy
+aa_hydropathy = {
+    "A": 1.8, "R": -4.5, "N": -3.5, "D": -3.5, "C": 2.5, "Q": -3.5, "E": -3.5,
+    "G": -0.4, "H": -3.2, "I": 4.5, "L": 3.8, "K": -3.9, "M": 1.9, "F": 2.8,
+    "P": -1.6, "S": -0.8, "T": -0.7, "W": -0.9, "Y": -1.3, "V": 4.2
+}
+
+# ===================
+# DIWV (Instability Index) from Biopython
+# ===================
+
+DIWV = {'A': {'A': 1.0, 'C': 44.94, 'E': 1.0, 'D': -7.49,
+              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': -7.49,
+              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': 1.0,
+              'Q': 1.0, 'P': 20.26, 'S': 1.0, 'R': 1.0,
+              'T': 1.0, 'W': 1.0, 'V': 1.0, 'Y': 1.0},
+        'C': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 20.26,
+              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 33.60,
+              'K': 1.0, 'M': 33.60, 'L': 20.26, 'N': 1.0,
+              'Q': -6.54, 'P': 20.26, 'S': 1.0, 'R': 1.0,
+              'T': 33.60, 'W': 24.68, 'V': -6.54, 'Y': 1.0},
+        'E': {'A': 1.0, 'C': 44.94, 'E': 33.60, 'D': 20.26,
+              'G': 1.0, 'F': 1.0, 'I': 20.26, 'H': -6.54,
+              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': 1.0,
+              'Q': 20.26, 'P': 20.26, 'S': 20.26, 'R': 1.0,
+              'T': 1.0, 'W': -14.03, 'V': 1.0, 'Y': 1.0},
+        'D': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 1.0,
+              'G': 1.0, 'F': -6.54, 'I': 1.0, 'H': 1.0,
+              'K': -7.49, 'M': 1.0, 'L': 1.0, 'N': 1.0,
+              'Q': 1.0, 'P': 1.0, 'S': 20.26, 'R': -6.54,
+              'T': -14.03, 'W': 1.0, 'V': 1.0, 'Y': 1.0},
+        'G': {'A': -7.49, 'C': 1.0, 'E': -6.54, 'D': 1.0,
+              'G': 13.34, 'F': 1.0, 'I': -7.49, 'H': 1.0,
+              'K': -7.49, 'M': 1.0, 'L': 1.0, 'N': -7.49,
+              'Q': 1.0, 'P': 1.0, 'S': 1.0, 'R': 1.0,
+              'T': -7.49, 'W': 13.34, 'V': 1.0, 'Y': -7.49},
+        'F': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 13.34,
+              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 1.0,
+              'K': -14.03, 'M': 1.0, 'L': 1.0, 'N': 1.0,
+              'Q': 1.0, 'P': 20.26, 'S': 1.0, 'R': 1.0,
+              'T': 1.0, 'W': 1.0, 'V': 1.0, 'Y': 33.601},
+        'I': {'A': 1.0, 'C': 1.0, 'E': 44.94, 'D': 1.0,
+              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 13.34,
+              'K': -7.49, 'M': 1.0, 'L': 20.26, 'N': 1.0,
+              'Q': 1.0, 'P': -1.88, 'S': 1.0, 'R': 1.0,
+              'T': 1.0, 'W': 1.0, 'V': -7.49, 'Y': 1.0},
+        'H': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 1.0,
+              'G': -9.37, 'F': -9.37, 'I': 44.94, 'H': 1.0,
+              'K': 24.68, 'M': 1.0, 'L': 1.0, 'N': 24.68,
+              'Q': 1.0, 'P': -1.88, 'S': 1.0, 'R': 1.0,
+              'T': -6.54, 'W': -1.88, 'V': 1.0, 'Y': 44.94},
+        'K': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 1.0,
+              'G': -7.49, 'F': 1.0, 'I': -7.49, 'H': 1.0,
+              'K': 1.0, 'M': 33.60, 'L': -7.49, 'N': 1.0,
+              'Q': 24.64, 'P': -6.54, 'S': 1.0, 'R': 33.60,
+              'T': 1.0, 'W': 1.0, 'V': -7.49, 'Y': 1.0},
+        'M': {'A': 13.34, 'C': 1.0, 'E': 1.0, 'D': 1.0,
+              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 58.28,
+              'K': 1.0, 'M': -1.88, 'L': 1.0, 'N': 1.0,
+              'Q': -6.54, 'P': 44.94, 'S': 44.94, 'R': -6.54,
+              'T': -1.88, 'W': 1.0, 'V': 1.0, 'Y': 24.68},
+        'L': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 1.0,
+              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 1.0,
+              'K': -7.49, 'M': 1.0, 'L': 1.0, 'N': 1.0,
+              'Q': 33.60, 'P': 20.26, 'S': 1.0, 'R': 20.26,
+              'T': 1.0, 'W': 24.68, 'V': 1.0, 'Y': 1.0},
+        'N': {'A': 1.0, 'C': -1.88, 'E': 1.0, 'D': 1.0,
+              'G': -14.03, 'F': -14.03, 'I': 44.94, 'H': 1.0,
+              'K': 24.68, 'M': 1.0, 'L': 1.0, 'N': 1.0,
+              'Q': -6.54, 'P': -1.88, 'S': 1.0, 'R': 1.0,
+              'T': -7.49, 'W': -9.37, 'V': 1.0, 'Y': 1.0},
+        'Q': {'A': 1.0, 'C': -6.54, 'E': 20.26, 'D': 20.26,
+              'G': 1.0, 'F': -6.54, 'I': 1.0, 'H': 1.0,
+              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': 1.0,
+              'Q': 20.26, 'P': 20.26, 'S': 44.94, 'R': 1.0,
+              'T': 1.0, 'W': 1.0, 'V': -6.54, 'Y': -6.54},
+        'P': {'A': 20.26, 'C': -6.54, 'E': 18.38, 'D': -6.54,
+              'G': 1.0, 'F': 20.26, 'I': 1.0, 'H': 1.0,
+              'K': 1.0, 'M': -6.54, 'L': 1.0, 'N': 1.0,
+              'Q': 20.26, 'P': 20.26, 'S': 20.26, 'R': -6.54,
+              'T': 1.0, 'W': -1.88, 'V': 20.26, 'Y': 1.0},
+        'S': {'A': 1.0, 'C': 33.60, 'E': 20.26, 'D': 1.0,
+              'G': 1.0, 'F': 1.0, 'I': 1.0, 'H': 1.0,
+              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': 1.0,
+              'Q': 20.26, 'P': 44.94, 'S': 20.26, 'R': 20.26,
+              'T': 1.0, 'W': 1.0, 'V': 1.0, 'Y': 1.0},
+        'R': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': 1.0,
+              'G': -7.49, 'F': 1.0, 'I': 1.0, 'H': 20.26,
+              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': 13.34,
+              'Q': 20.26, 'P': 20.26, 'S': 44.94, 'R': 58.28,
+              'T': 1.0, 'W': 58.28, 'V': 1.0, 'Y': -6.54},
+        'T': {'A': 1.0, 'C': 1.0, 'E': 20.26, 'D': 1.0,
+              'G': -7.49, 'F': 13.34, 'I': 1.0, 'H': 1.0,
+              'K': 1.0, 'M': 1.0, 'L': 1.0, 'N': -14.03,
+              'Q': -6.54, 'P': 1.0, 'S': 1.0, 'R': 1.0,
+              'T': 1.0, 'W': -14.03, 'V': 1.0, 'Y': 1.0},
+        'W': {'A': -14.03, 'C': 1.0, 'E': 1.0, 'D': 1.0,
+              'G': -9.37, 'F': 1.0, 'I': 1.0, 'H': 24.68,
+              'K': 1.0, 'M': 24.68, 'L': 13.34, 'N': 13.34,
+              'Q': 1.0, 'P': 1.0, 'S': 1.0, 'R': 1.0,
+              'T': -14.03, 'W': 1.0, 'V': -7.49, 'Y': 1.0},
+        'V': {'A': 1.0, 'C': 1.0, 'E': 1.0, 'D': -14.03,
+              'G': -7.49, 'F': 1.0, 'I': 1.0, 'H': 1.0,
+              'K': -1.88, 'M': 1.0, 'L': 1.0, 'N': 1.0,
+              'Q': 1.0, 'P': 20.26, 'S': 1.0, 'R': 1.0,
+              'T': -7.49, 'W': 1.0, 'V': 1.0, 'Y': -6.54},
+        'Y': {'A': 24.68, 'C': 1.0, 'E': -6.54, 'D': 24.68,
+              'G': -7.49, 'F': 1.0, 'I': 1.0, 'H': 13.34,
+              'K': 1.0, 'M': 44.94, 'L': 1.0, 'N': 1.0,
+              'Q': 1.0, 'P': 13.34, 'S': 1.0, 'R': -15.91,
+              'T': -7.49, 'W': -9.37, 'V': 1.0, 'Y': 13.34},
+        }
+
+# Files at least this big are scanned through mmap instead of line by line
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# Compressed inputs are recognised by their first bytes, whatever they are called
+COMPRESSION_MAGIC = {b"\x1f\x8b": "gzip", b"BZh": "bz2", b"\xfd7zXZ\x00": "xz"}
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz"}
+_OPENERS = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+
+def detect_compression(filename):
+    """Return "gzip", "bz2" or "xz" if the file starts with that format's magic bytes, else None."""
+    with open(filename, "rb") as f:
+        start = f.read(6)
+    return next((name for magic, name in COMPRESSION_MAGIC.items() if start.startswith(magic)), None)
+
+def _strip_compression_suffix(filename):
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+def output_base(filename):
+    """filename without its extension, e.g. "lib" for lib.fasta and lib.fasta.gz."""
+    return _strip_compression_suffix(filename).rsplit(".", 1)[0]
+
+class _DecompressThread(io.RawIOBase):
+    """Binary stream decompressed ahead of the reader by a background thread.
+
+    zlib, bz2 and lzma release the GIL, so decompression overlaps with whatever
+    the main thread does with the text. At most `depth` chunks are held in memory.
+    """
+    def __init__(self, stream, chunk_size=1024 * 1024, depth=8):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(depth)
+        self._stop = threading.Event()
+        self._chunk = memoryview(b"")
+        self._eof = False
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        try:
+            while not self._stop.is_set():
+                chunk = self._stream.read(self._chunk_size)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self._chunk:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._chunk = memoryview(item)
+        n = min(len(b), len(self._chunk))
+        b[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._stream.close()
+        super().close()
+
+def open_input(filename, newline=None):
+    """Open a text file for reading, decompressing gzip/bz2/xz on a background thread."""
+    compression = detect_compression(filename)
+    if compression is None:
+        return open(filename, "r", newline=newline)
+    raw = _DecompressThread(_OPENERS[compression](filename, "rb"))
+    return io.TextIOWrapper(io.BufferedReader(raw), newline=newline)
+
+def open_output(filename, compression=None):
+    """Open a CSV file for writing, compressed if compression is "gzip", "bz2" or "xz"."""
+    if compression is None:
+        return open(filename, "w", newline="")
+    return _OPENERS[compression](filename, "wt", newline="")
+
+def iter_fasta(filename):
+    """Yield (header, sequence) for each record of a FASTA file as it is read."""
+    compression = detect_compression(filename)
+    if compression is None and os.path.getsize(filename) >= MMAP_THRESHOLD:
+        yield from _iter_fasta_mmap(filename)
+        return
+
+    header = None
+    seq = []
+    with open_input(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(">"):
+                if header and seq:
+                    yield header, "".join(seq).upper()
+                header = line[1:].split()[0]
+                seq = []
+            elif line:
+                seq.append(line)
+        if header and seq:
+            yield header, "".join(seq).upper()
+
+def _iter_fasta_mmap(filename):
+    """Same records as iter_fasta, found by searching a memory-mapped file."""
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = 0 if mm[:1] == b">" else mm.find(b"\n>") + 1
+        if pos == 0 and mm[:1] != b">":
+            return
+        while True:
+            end = mm.find(b"\n>", pos)
+            record = mm[pos:end if end != -1 else len(mm)]
+            header_line, _, body = record.partition(b"\n")
+            header = header_line[1:].split()[0].decode()
+            seq = b"".join(line.strip() for line in body.split(b"\n"))
+            if header and seq:
+                yield header, seq.decode().upper()
+            if end == -1:
+                return
+            pos = end + 1
+
+def read_fasta_multiseq(filename):
+    """Read a multi-sequence FASTA and return dict {header: sequence}.
+
+    Later records with a repeated header replace earlier ones, use iter_fasta to keep them all.
+    """
+    return dict(iter_fasta(filename))
+
+# Column names checked, in order, for the sequences
+SEQUENCE_COLUMNS = ["sequences", "sequence_alignment_aa", "VHH", "sequence", "Sequences", "Sequence", "AA seq", "aa seq", "AA Seq", "aa Seq", "AA seq (inc signal peptide)","Aaseq (mat protein only)"]
+
+def clean_sequence(seq):
+    return seq.replace(" ", "").strip()
+
+def iter_csv(filename, id_column=None):
+    """Yield (id, cleaned sequence) for each row, the id being id_column or the 1-based row number."""
+    with open_input(filename, newline="") as f:
+        reader = csv.DictReader(f)
+        seq_col = next((col for col in SEQUENCE_COLUMNS if col in (reader.fieldnames or [])), None)
+        if seq_col is None:
+            raise ValueError(f"{filename} must have one of these columns: {SEQUENCE_COLUMNS}")
+        for i, row in enumerate(reader, 1):
+            yield (row[id_column] if id_column else str(i)), clean_sequence(row[seq_col])
+
+def iter_records(filename, id_column=None):
+    """Yield (id, sequence) from a CSV (by extension) or FASTA file, either possibly compressed."""
+    if _strip_compression_suffix(filename.lower()).endswith(".csv"):
+        return iter_csv(filename, id_column)
+    return iter_fasta(filename)
+
+def molecular_weight(seq):
+    return (sum(aa_weights[aa] for aa in seq) - (len(seq) - 1) * 18.01528) / 1000
+
+def charge_groups(seq):
+    """Return the (pKa, count) groups of positive and negative charges in seq."""
+    Nterm = Nterm_pKa.get(seq[0], 7.5)
+    last = seq[-1]
+    Cterm = pK_cterm.get(last, Cterm_default)
+
+    # Count charged residues
+    counts = {aa: seq.count(aa) for aa in "KRHDECY"}
+    # Avoid double-counting C-terminal D/E
+    if last in ["D", "E"]:
+        counts[last] = max(0, counts[last]-1)
+
+    # Positive: K, R, H + Nterm
+    pos_groups = [(pKa_fixed[aa], counts[aa]) for aa in "KRH" if counts[aa] > 0]
+    pos_groups.append((Nterm, 1))
+    # Negative: D, E, C, Y + Cterm
+    neg_groups = [(pKa_fixed[aa], counts[aa]) for aa in "DECY" if counts[aa] > 0]
+    neg_groups.append((Cterm, 1))
+    return pos_groups, neg_groups
+
+def _charge_at(pos_groups, neg_groups, ph):
+    pos = sum(c / (1 + 10**(ph - pk)) for pk, c in pos_groups)
+    neg = sum(c / (1 + 10**(pk - ph)) for pk, c in neg_groups)
+    return pos - neg
+
+def net_charge(seq, ph):
+    """Net charge of seq at the given pH, using the same pKa values as calculate_pI."""
+    return _charge_at(*charge_groups(seq.upper()), ph)
+
+def calculate_pI(seq, epsilon=0.0001):
+    pos_groups, neg_groups = charge_groups(seq.upper())
+
+    def bisect(low, high):
+        mid = (low + high)/2
+        charge = _charge_at(pos_groups, neg_groups, mid)
+        if high - low < epsilon:
+            return mid
+        if charge > 0:
+            return bisect(mid, high)
+        else:
+            return bisect(low, mid)
+
+    return round(bisect(4.0, 12.0), 2)
+
+
+def extinction_coefficient(seq):
+    return (seq.count("W") * aa_extinction["W"] + seq.count("Y") * aa_extinction["Y"] + (seq.count("C") // 2) * aa_extinction["C"]) / (sum(aa_weights[aa] for aa in seq) - (len(seq) - 1) * 18.01528)
+
+def instability_index(seq):
+    score = 0
+    for i in range(len(seq) - 1):
+        score += DIWV.get(seq[i], {}).get(seq[i+1], 0)
+    return (10.0 / len(seq)) * score
+
+def aliphatic_index(seq):
+    a, b = 2.9, 3.9
+    total = len(seq)
+    ai = (seq.count("A") + a * seq.count("V") + b * (seq.count("I") + seq.count("L"))) / total * 100
+    return ai
+
+def half_life(seq):
+    nterm = seq[0]
+    if nterm in ["A", "G", "M", "S", "T", "V"]:
+        return ">30 hours"
+    elif nterm in ["I", "L", "N", "Q", "C"]:
+        return "10 hours"
+    elif nterm in ["R", "K", "H"]:
+        return "2 minutes"
+    elif nterm in ["F", "Y", "W"]:
+        return "2 minutes"
+    elif nterm in ["D", "E"]:
+        return "3 minutes"
+    else:
+        return "Unknown"
+
+# Output columns, in the order metric rows are returned
+COLUMNS = ["Length", "MW (kDa)", "pI", "Extinction Coefficient", "Instability Index", "Aliphatic Index", "Half-life"]
+
+def compute_batch(sequences):
+    """Return {column: [value per sequence]} for cleaned sequences, rounded as in the CSV output."""
+    from protbatch import blocks, metric_rows
+
+    columns = {name: [] for name in COLUMNS}
+    for block in blocks(sequences):
+        for row in metric_rows(block):
+            for name, value in zip(COLUMNS, row):
+                columns[name].append(value)
+    return columns
@@ -0,0 +1,182 @@
+"""
+Sequence liability motifs (deamidation, isomerisation, glycosylation, ...).
+
+All motifs are compiled into a single automaton, a table of state x residue
+transitions, so each sequence is scanned once however many motifs there are.
+With numpy a whole block of sequences steps through the automaton together,
+one residue position at a time; without it each sequence is walked in Python.
+
+Patterns use one letter per residue, X for any residue, [ST] for a choice and
+[^P] for anything but P. A motif file has one "name pattern" pair per line:
+
+    # name        pattern
+    deamidation   N[GS]
+    glycosylation N[^P][ST]
+"""
+from protbatch import AA_INDEX, RESIDUE_CODES, UNKNOWN, np
+
+DEFAULT_MOTIFS = {
+    "deamidation": "N[GS]",
+    "isomerization": "D[GS]",
+    "n_glycosylation": "N[^P][ST]",
+    "oxidation": "[MW]",
+}
+
+# Codes past the end of a sequence, which send every state back to the start
+_PAD = UNKNOWN + 1
+
+
+def parse_pattern(pattern):
+    """Return the set of residue codes allowed at each position of a pattern."""
+    anything = set(range(UNKNOWN + 1))
+    steps = []
+    i = 0
+    pattern = pattern.upper()
+    while i < len(pattern):
+        if pattern[i] == "[":
+            end = pattern.find("]", i)
+            if end == -1:
+                raise ValueError(f"Unclosed '[' in motif pattern {pattern}")
+            letters = pattern[i + 1:end]
+            negate = letters.startswith("^")
+            codes = {AA_INDEX[aa] for aa in letters.lstrip("^") if aa in AA_INDEX}
+            if len(codes) != len(letters.lstrip("^")) or not codes:
+                raise ValueError(f"Bad residue class [{letters}] in motif pattern {pattern}")
+            steps.append(anything - codes if negate else codes)
+            i = end + 1
+        elif pattern[i] == "X":
+            steps.append(anything)
+            i += 1
+        elif pattern[i] in AA_INDEX:
+            steps.append({AA_INDEX[pattern[i]]})
+            i += 1
+        else:
+            raise ValueError(f"Unknown residue '{pattern[i]}' in motif pattern {pattern}")
+    if not steps:
+        raise ValueError("Empty motif pattern")
+    return steps
+
+
+def read_motifs(filename):
+    """Read {name: pattern} from a motif file."""
+    motifs = {}
+    with open(filename) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            name, *pattern = line.split()
+            if len(pattern) != 1:
+                raise ValueError(f"{filename}: expected 'name pattern', got '{line}'")
+            motifs[name] = pattern[0]
+    return motifs
+
+
+class MotifScanner:
+    def __init__(self, motifs=None):
+        motifs = DEFAULT_MOTIFS if motifs is None else motifs
+        if len(motifs) > 63:
+            raise ValueError("At most 63 motifs can be scanned at once")
+        self.names = list(motifs)
+        patterns = [parse_pattern(pattern) for pattern in motifs.values()]
+        self.widths = [len(steps) for steps in patterns]
+
+        # Each state is the set of (motif, residues matched so far) partial
+        # matches; a state holding a complete match reports that motif
+        starts = {(m, 0) for m in range(len(patterns))}
+        states = [frozenset()]
+        index = {states[0]: 0}
+        self.delta = []
+        self.emits = []
+        for state in states:
+            row = []
+            for code in range(_PAD + 1):
+                after = frozenset((m, i + 1) for m, i in state | starts
+                                  if code != _PAD and i < len(patterns[m]) and code in patterns[m][i])
+                if after not in index:
+                    index[after] = len(states)
+                    states.append(after)
+                row.append(index[after])
+            self.delta.append(row)
+            self.emits.append(sum(1 << m for m, i in state if i == len(patterns[m])))
+
+        if np is not None:
+            self._delta = np.array(self.delta, dtype=np.int32)
+            self._emits = np.array(self.emits, dtype=np.int64)
+
+    def columns(self, sep=" "):
+        """Output column names, e.g. "deamidation count", "deamidation positions", ..., "Unpaired Cys"."""
+        names = []
+        for name in self.names:
+            names += [f"{name}{sep}count", f"{name}{sep}positions"]
+        return names + [f"Unpaired{sep}Cys"]
+
+    def rows(self, seqs):
+        """
+        Return one row per sequence: a count and the ";"-separated 1-based start
+        positions for each motif, then 1 if the sequence has an odd number of cysteines.
+        """
+        if not seqs:
+            return []
+        if np is None:
+            return [self._scan_one(seq) for seq in seqs]
+
+        n = len(seqs)
+        lengths = np.fromiter((len(s) for s in seqs), dtype=np.int64, count=n)
+        offsets = np.zeros(n, dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        codes = RESIDUE_CODES[np.frombuffer("".join(seqs).encode("ascii", "replace"), dtype=np.uint8)]
+
+        # Step every sequence through the automaton together. Longest first, so
+        # the sequences still going at position j are always the first few
+        order = np.argsort(-lengths, kind="stable")
+        starts_at = offsets[order]
+        still_going = np.searchsorted(-lengths[order], -np.arange(int(lengths.max())), side="left")
+        state = np.zeros(n, dtype=np.int32)
+        hit_seqs, hit_ends, hit_masks = [], [], []
+        for j, k in enumerate(still_going.tolist()):
+            state[:k] = self._delta[state[:k], codes[starts_at[:k] + j]]
+            emitted = self._emits[state[:k]]
+            found = np.flatnonzero(emitted)
+            if found.size:
+                hit_seqs.append(order[found])
+                hit_ends.append(np.full(found.size, j))
+                hit_masks.append(emitted[found])
+
+        rows = [[] for _ in range(n)]
+        if hit_seqs:
+            hit_seqs, hit_ends, hit_masks = (np.concatenate(a) for a in (hit_seqs, hit_ends, hit_masks))
+            by_seq = np.lexsort((hit_ends, hit_seqs))
+            hit_seqs, hit_ends, hit_masks = hit_seqs[by_seq], hit_ends[by_seq], hit_masks[by_seq]
+        else:
+            hit_seqs = hit_ends = hit_masks = np.zeros(0, dtype=np.int64)
+        for m, motif_width in enumerate(self.widths):
+            found = ((hit_masks >> m) & 1).astype(bool)
+            counts = np.bincount(hit_seqs[found], minlength=n)
+            starts = (hit_ends[found] - motif_width + 2).tolist()
+            bounds = np.concatenate([[0], np.cumsum(counts)]).tolist()
+            for i, count in enumerate(counts.tolist()):
+                rows[i] += [count, ";".join(map(str, starts[bounds[i]:bounds[i + 1]])) if count else ""]
+
+        cysteines = np.bincount(np.repeat(np.arange(n), lengths)[codes == AA_INDEX["C"]], minlength=n)
+        for row, odd in zip(rows, (cysteines % 2).tolist()):
+            row.append(odd)
+        return rows
+
+    def _scan_one(self, seq):
+        positions = [[] for _ in self.names]
+        state = 0
+        for j, aa in enumerate(seq):
+            state = self.delta[state][AA_INDEX.get(aa, UNKNOWN)]
+            found = self.emits[state]
+            m = 0
+            while found:
+                if found & 1:
+                    positions[m].append(j - self.widths[m] + 2)
+                found >>= 1
+                m += 1
+        row = []
+        for starts in positions:
+            row += [len(starts), ";".join(map(str, starts))]
+        return row + [seq.count("C") % 2]
+
@@ -0,0 +1,126 @@
+"""
+Sliding-window property profiles for long sequences.
+
+For every window of a sequence this gives the instability index, aliphatic
+index, Kyte-Doolittle hydropathy and sidechain net charge at a chosen pH. Each
+property is turned into a per-residue (or per-dipeptide) value, summed once into
+a cumulative array, and every window is the difference of two entries, so a
+whole profile costs O(n) whatever the window size.
+
+Usage:
+    python protprofile.py <FASTA_FILE> [--window 9] [--step 1] [--ph 7.0]
+
+Profiles are saved to <FASTA_FILE>_profiles.npz and can be read back with
+load_profiles.
+"""
+import sys
+import argparse
+
+import numpy as np
+
+from protlib import pKa_fixed, aa_hydropathy, iter_fasta, output_base
+from protbatch import AA_INDEX, AA_ORDER, DIWV_MATRIX, UNKNOWN, blocks, encode
+
+PROFILES = ["instability", "aliphatic", "hydropathy", "charge"]
+
+_ALIPHATIC = np.zeros(UNKNOWN + 1)
+for _aa, _weight in {"A": 1.0, "V": 2.9, "I": 3.9, "L": 3.9}.items():
+    _ALIPHATIC[AA_INDEX[_aa]] = _weight
+
+_HYDROPATHY = np.array([aa_hydropathy[aa] for aa in AA_ORDER] + [0.0])
+
+
+def residue_charges(ph):
+    """Sidechain charge of each residue code at the given pH, same pKa values as calculate_pI."""
+    charges = np.zeros(UNKNOWN + 1)
+    for aa in "KRH":
+        charges[AA_INDEX[aa]] = 1 / (1 + 10 ** (ph - pKa_fixed[aa]))
+    for aa in "DECY":
+        charges[AA_INDEX[aa]] = -1 / (1 + 10 ** (pKa_fixed[aa] - ph))
+    return charges
+
+
+def _prefix(values):
+    """Cumulative sum with a leading zero, so prefix[j] - prefix[i] sums values[i:j]."""
+    prefix = np.zeros(len(values) + 1)
+    np.cumsum(values, out=prefix[1:])
+    return prefix
+
+
+def window_profiles(seqs, window=9, step=1, ph=7.0):
+    """
+    Profile a block of sequences.
+
+    Returns (counts, profiles): the number of windows for each sequence, and
+    {property: float32 array} with every sequence's windows back to back.
+    Window k of a sequence starts at residue k * step + 1.
+    """
+    codes, offsets, lengths = encode(seqs)
+    counts = np.maximum(0, (lengths - window) // step + 1)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    starts = np.repeat(offsets, counts) + (np.arange(counts.sum()) - first) * step
+
+    pair_scores = np.zeros(len(codes))
+    pair_scores[:-1] = DIWV_MATRIX[codes[:-1], codes[1:]]
+
+    def window_sum(values, span=window):
+        prefix = _prefix(values)
+        return prefix[starts + span] - prefix[starts]
+
+    profiles = {
+        # A window of w residues holds w - 1 dipeptides, none crossing into the next sequence
+        "instability": 10.0 / window * window_sum(pair_scores, window - 1),
+        "aliphatic": window_sum(_ALIPHATIC[codes]) / window * 100,
+        "hydropathy": window_sum(_HYDROPATHY[codes]) / window,
+        "charge": window_sum(residue_charges(ph)[codes]),
+    }
+    return counts, {name: values.astype(np.float32) for name, values in profiles.items()}
+
+
+def save_profiles(path, ids, counts, profiles, window, step, ph):
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    np.savez(path, ids=np.array(ids, dtype=str), offsets=offsets,
+             window=window, step=step, ph=ph, **profiles)
+
+
+def load_profiles(path):
+    """Return {id: {property: array}} from a file written by save_profiles."""
+    with np.load(path) as data:
+        offsets = data["offsets"]
+        columns = {name: data[name] for name in PROFILES}
+        ids = data["ids"].tolist()
+    return {seq_id: {name: values[offsets[i]:offsets[i + 1]] for name, values in columns.items()}
+            for i, seq_id in enumerate(ids)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sliding-window instability, aliphatic, hydropathy and charge profiles.")
+    parser.add_argument("fasta_file")
+    parser.add_argument("--window", type=int, default=9, help="residues per window (default 9)")
+    parser.add_argument("--step", type=int, default=1, help="residues between window starts (default 1)")
+    parser.add_argument("--ph", type=float, default=7.0, help="pH for the net charge profile (default 7.0)")
+    args = parser.parse_args(argv)
+
+    if args.window < 2 or args.step < 1:
+        print("Error: --window must be at least 2 and --step at least 1")
+        sys.exit(1)
+
+    ids, counts, parts = [], [], {name: [] for name in PROFILES}
+    for block in blocks(iter_fasta(args.fasta_file)):
+        block_counts, profiles = window_profiles([seq for _, seq in block], args.window, args.step, args.ph)
+        ids.extend(header for header, _ in block)
+        counts.append(block_counts)
+        for name in PROFILES:
+            parts[name].append(profiles[name])
+
+    output_file = output_base(args.fasta_file) + "_profiles.npz"
+    save_profiles(output_file, ids,
+                  np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64),
+                  {name: np.concatenate(values) if values else np.zeros(0, dtype=np.float32)
+                   for name, values in parts.items()},
+                  args.window, args.step, args.ph)
+    print(f"Profiles saved to {output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Saturation mutagenesis scan of ProtParam metrics.
+
+Every single-point mutant of a sequence is scored as a change from the parent
+instead of recalculating the whole mutant: composition-based metrics move by
+one residue, the instability score only changes in the two dipeptides either
+side of the mutated position, and pI is solved once per distinct set of charged
+residues and termini. Each variant costs O(1) on top of one pass over the parent;
+the rare mutant landing on a rounding boundary is recalculated in full so the
+tables agree with fastaprot.py to the last digit.
+
+Usage:
+    python protscan.py <FASTA_FILE> [--out DIR]
+
+For each record, writes one position x amino-acid CSV per metric into
+DIR/<record id>/ (default <FASTA_FILE>_scan/<record id>/).
+"""
+import os
+import csv
+import argparse
+
+import numpy as np
+
+from protlib import aa_extinction, iter_fasta, output_base
+from protbatch import (AA_INDEX, AA_ORDER, DIWV_MATRIX, HALF_LIFE_BY_CODE, RESIDUE_WEIGHTS,
+                       UNKNOWN, batch_pI, composition, encode, metric_rows)
+
+SCAN_METRICS = {
+    "mw_kda": 2,
+    "pi": 2,
+    "extinction_coefficient": 3,
+    "instability_index": 2,
+    "aliphatic_index": 2,
+    "half_life": None,
+}
+
+
+def mutant_scan(seq):
+    """
+    Return {metric: (len(seq), 20) array} where [i, k] is the metric for the
+    mutant with residue AA_ORDER[k] at position i + 1. Values are rounded like
+    the CSV output, so the wild-type column matches the parent's row.
+    """
+    codes, _, lengths = encode([seq])
+    n = int(lengths[0])
+    counts = composition(codes, lengths)[0]
+    positions = np.arange(n)
+    new = np.arange(len(AA_ORDER))
+    # Residues gained / lost at every (position, new residue)
+    gained = np.zeros((n, len(AA_ORDER), UNKNOWN + 1), dtype=np.int64)
+    gained[:, new, new] = 1
+    gained[positions, :, codes] -= 1
+    mutant_counts = counts + gained
+
+    def count(aa):
+        return mutant_counts[:, :, AA_INDEX[aa]]
+
+    weights = RESIDUE_WEIGHTS[:len(AA_ORDER)]
+    mass = (RESIDUE_WEIGHTS[codes].sum() - RESIDUE_WEIGHTS[codes][:, None] + weights[None, :]
+            - (n - 1) * 18.01528)
+
+    extinction = (count("W") * aa_extinction["W"] + count("Y") * aa_extinction["Y"]
+                  + (count("C") // 2) * aa_extinction["C"]) / mass
+
+    aliphatic = (count("A") + 2.9 * count("V") + 3.9 * (count("I") + count("L"))) / n * 100
+
+    # Only the dipeptides either side of position i change
+    pair_scores = DIWV_MATRIX[codes[:-1], codes[1:]]
+    score = pair_scores.sum()
+    old_left = np.concatenate([[0.0], pair_scores])
+    old_right = np.concatenate([pair_scores, [0.0]])
+    new_left = np.zeros((n, len(AA_ORDER)))
+    new_left[1:] = DIWV_MATRIX[codes[:-1]][:, :len(AA_ORDER)]
+    new_right = np.zeros((n, len(AA_ORDER)))
+    new_right[:-1] = DIWV_MATRIX[:len(AA_ORDER), codes[1:]].T
+    instability = (10.0 / n) * (score - old_left[:, None] - old_right[:, None] + new_left + new_right)
+
+    # Termini only change when the mutation is at either end
+    first = np.broadcast_to(codes[0], (n, len(AA_ORDER))).copy()
+    first[0] = new
+    last = np.broadcast_to(codes[-1], (n, len(AA_ORDER))).copy()
+    last[-1] = new
+
+    # pI depends on charged-residue counts and termini alone, most mutants share the parent's
+    charged = [AA_INDEX[aa] for aa in "KRHDECY"]
+    keys = np.column_stack([mutant_counts[:, :, charged].reshape(-1, len(charged)),
+                            first.ravel(), last.ravel()])
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    unique_counts = np.zeros((len(unique), UNKNOWN + 1), dtype=np.int64)
+    unique_counts[:, charged] = unique[:, :len(charged)]
+    pI = batch_pI(unique_counts, unique[:, -2], unique[:, -1])[inverse.ravel()].reshape(n, len(AA_ORDER))
+
+    values = {
+        "mw_kda": mass / 1000,
+        "pi": pI,
+        "extinction_coefficient": extinction,
+        "instability_index": instability,
+        "aliphatic_index": aliphatic,
+        "half_life": HALF_LIFE_BY_CODE[first],
+    }
+    scan = {}
+    near_tie = np.zeros((n, len(AA_ORDER)), dtype=bool)
+    for name, places in SCAN_METRICS.items():
+        if places is None:
+            scan[name] = values[name]
+            continue
+        scaled = values[name] * 10 ** places
+        # The delta sums in a different order to a full recalculation, so the
+        # last bit can differ and flip a value sitting on a rounding boundary
+        near_tie |= np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+        scan[name] = np.round(values[name], places)
+
+    # Recalculate those few mutants in full so the table matches metric_rows exactly
+    if near_tie.any():
+        rows, cols = np.nonzero(near_tie)
+        mutants = [seq[:i] + AA_ORDER[k] + seq[i + 1:] for i, k in zip(rows.tolist(), cols.tolist())]
+        exact = metric_rows(mutants)
+        for j, name in enumerate(SCAN_METRICS, start=1):
+            scan[name][rows, cols] = [row[j] for row in exact]
+    return scan
+
+
+def write_scan(out_dir, seq, scan):
+    os.makedirs(out_dir, exist_ok=True)
+    for name, table in scan.items():
+        with open(os.path.join(out_dir, name + ".csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Position", "WT"] + list(AA_ORDER))
+            for i, row in enumerate(table.tolist()):
+                writer.writerow([i + 1, seq[i]] + row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ProtParam metrics for every single-point mutant of each sequence.")
+    parser.add_argument("fasta_file")
+    parser.add_argument("--out", help="output directory (default <FASTA_FILE>_scan)")
+    args = parser.parse_args(argv)
+
+    out_root = args.out or output_base(args.fasta_file) + "_scan"
+    for header, seq in iter_fasta(args.fasta_file):
+        write_scan(os.path.join(out_root, header.replace(os.sep, "_")), seq, mutant_scan(seq))
+        print(f"{header}: {len(seq) * (len(AA_ORDER) - 1)} mutants scanned")
+    print(f"Scan tables saved to {out_root}")
+
+if __name__ == "__main__":
+    main()
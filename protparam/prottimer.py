@@ -0,0 +1,102 @@
+"""
+Per-stage timers for --profile runs of fastaprot.py and csvprot.py.
+
+A StageTimer adds up wall time per named stage (read, clean, each metric,
+write, ...). Code that is always instrumented takes NO_TIMER by default, which
+does nothing, so unprofiled runs pay almost nothing for the hooks.
+"""
+import json
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from time import perf_counter
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process or its workers in MB, None where unavailable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Workers are children, so take whichever peak is higher
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak_kb / 1024, 1)
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+        self.started = perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add({name: perf_counter() - start})
+
+    def timed(self, name, iterable):
+        """Yield from iterable, counting the time spent waiting on each item as `name`."""
+        it = iter(iterable)
+        while True:
+            start = perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add({name: perf_counter() - start})
+                return
+            self.add({name: perf_counter() - start})
+            yield item
+
+    def add(self, seconds):
+        """Merge stage times, e.g. ones sent back from a worker process."""
+        for name, value in seconds.items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + value
+
+    def report(self, rows, **extra):
+        wall = perf_counter() - self.started
+        total = sum(self.seconds.values()) or 1.0
+        return {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "rows": rows,
+            "wall_seconds": round(wall, 4),
+            "rows_per_s": round(rows / wall, 1) if wall else None,
+            "peak_rss_mb": peak_memory_mb(),
+            "stages": {name: {"seconds": round(value, 4), "share": round(value / total, 4)}
+                       for name, value in sorted(self.seconds.items(), key=lambda kv: -kv[1])},
+            **extra,
+        }
+
+    def summary(self, rows, json_file=None, **extra):
+        """Return a printable table of the stages, writing the report to json_file if given."""
+        report = self.report(rows, **extra)
+        if json_file:
+            with open(json_file, "w") as f:
+                json.dump(report, f, indent=2)
+
+        lines = [f"{'Stage':<16}{'Seconds':>10}{'Share':>9}"]
+        for name, stage in report["stages"].items():
+            lines.append(f"{name:<16}{stage['seconds']:>10.3f}{100 * stage['share']:>8.1f}%")
+        memory = f"{report['peak_rss_mb']} MB" if report["peak_rss_mb"] is not None else "unknown"
+        lines.append(f"{report['rows']} rows in {report['wall_seconds']:.2f} s "
+                     f"({report['rows_per_s'] or 0:.0f} rows/s), peak memory {memory}")
+        if extra.get("jobs", 1) > 1:
+            lines.append("Metric stages are summed over all worker processes")
+        if json_file:
+            lines.append(f"Profile saved to {json_file}")
+        return "\n".join(lines)
+
+
+class _NoTimer:
+    def stage(self, name):
+        return nullcontext()
+
+    def timed(self, name, iterable):
+        return iterable
+
+    def add(self, seconds):
+        pass
+
+
+NO_TIMER = _NoTimer()
@@ -0,0 +1,74 @@
+"""
+Charge-versus-pH titration curves for whole libraries.
+
+Net charge is evaluated for every sequence at every point of a pH grid in one
+vectorised pass per block, with the same pKa tables as calculate_pI.
+
+Usage:
+    python prottitrate.py <FASTA_or_CSV> [--ph-range 2:12:0.1] [--csv]
+
+The (sequences x pH points) matrix is saved to <input>_titration.npz with the
+sequence ids and the pH grid, or to <input>_titration.csv with --csv.
+"""
+import sys
+import csv
+import argparse
+
+import numpy as np
+
+from protlib import iter_records, output_base
+from protbatch import batch_net_charge, blocks
+
+
+def ph_grid(text):
+    """Turn 'start:stop:step' into the pH points from start to stop inclusive."""
+    try:
+        start, stop, step = (float(x) for x in text.split(":"))
+    except ValueError:
+        raise ValueError("--ph-range must look like start:stop:step, e.g. 2:12:0.1") from None
+    if step <= 0:
+        raise ValueError("--ph-range step must be greater than 0")
+    if start > stop:
+        raise ValueError("--ph-range start must not be greater than stop")
+    return np.round(np.arange(start, stop + step / 2, step), 6)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Net charge of every sequence across a pH grid.")
+    parser.add_argument("input_file", help="FASTA, or CSV with a sequence column")
+    parser.add_argument("--ph-range", default="2:12:0.1", help="start:stop:step (default 2:12:0.1)")
+    parser.add_argument("--id-column", help="CSV column to use as the ID (default row number)")
+    parser.add_argument("--csv", action="store_true", help="write a CSV with one column per pH instead of .npz")
+    args = parser.parse_args(argv)
+
+    try:
+        phs = ph_grid(args.ph_range)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    base = output_base(args.input_file) + "_titration"
+    records = blocks(iter_records(args.input_file, args.id_column))
+
+    if args.csv:
+        output_file = base + ".csv"
+        with open(output_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ID"] + [f"{ph:g}" for ph in phs])
+            for block in records:
+                charges = batch_net_charge([seq for _, seq in block], phs)
+                for (seq_id, _), row in zip(block, np.round(charges, 3).tolist()):
+                    writer.writerow([seq_id] + row)
+    else:
+        output_file = base + ".npz"
+        ids, parts = [], []
+        for block in records:
+            ids.extend(seq_id for seq_id, _ in block)
+            parts.append(batch_net_charge([seq for _, seq in block], phs).astype(np.float32))
+        np.savez(output_file, ids=np.array(ids, dtype=str), ph=phs,
+                 charge=np.concatenate(parts) if parts else np.zeros((0, len(phs)), dtype=np.float32))
+
+    print(f"Titration curves saved to {output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Make complexfig/outline/electropot figures for many structures without clicking.
+
+Reads a CSV manifest with a structure column (file path or PDB ID), and
+optionally command (complexfig, outline or electropot, default --command),
+chains (for complexfig, e.g. A or "A,D") and png (output file name). Each
+worker process starts headless PyMOL once and renders one structure after
+another, ray tracing every figure at the chosen size and DPI. Timings and any
+failures go to summary.csv in the output folder.
+
+    python batchfig.py figures.csv --out-dir figures --workers 4 --width 2400 --height 1800 --dpi 300
+"""
+import os
+import csv
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+SUMMARY_COLUMNS = ["structure", "command", "chains", "png", "status", "seconds", "error"]
+
+# Set in each worker by _start_pymol
+cmd = None
+COMMANDS = {}
+THREADS = None
+
+def _start_pymol(threads):
+    global cmd, COMMANDS, THREADS
+    from pymol import cmd
+    import complexfig
+    import electropot
+    import outline
+    COMMANDS = {"complexfig": complexfig.complexfig, "outline": outline.outline, "electropot": electropot.electropot}
+    # Ray tracing is multithreaded, share the cores out between the workers
+    THREADS = threads
+    cmd.set("max_threads", threads)
+
+def object_name(structure):
+    """PyMOL object name for a structure file or PDB ID."""
+    name = os.path.splitext(os.path.basename(structure))[0]
+    return "".join(c if c.isalnum() or c in "_-" else "_" for c in name)
+
+def render(job):
+    """Draw one figure in this worker's PyMOL and return its summary row."""
+    row, width, height, dpi = job
+    row = dict(row, status="ok", error="")
+    start = time.perf_counter()
+    try:
+        command = COMMANDS[row["command"]]
+        # Start from a clean session, settings included, so the thread share is set again
+        cmd.reinitialize()
+        cmd.set("max_threads", THREADS)
+        obj = object_name(row["structure"])
+        if os.path.exists(row["structure"]):
+            cmd.load(row["structure"], obj)
+        else:
+            cmd.fetch(row["structure"], obj, async_=0)
+        if not cmd.get_object_list(obj):
+            raise ValueError(f"could not load {row['structure']}")
+        if row["command"] == "complexfig":
+            command(obj, row["chains"])
+        else:
+            command(obj)
+        # A PNG from an earlier run would otherwise pass for this one
+        if os.path.exists(row["png"]):
+            os.remove(row["png"])
+        cmd.png(row["png"], width=width, height=height, dpi=dpi, ray=1)
+        if not os.path.exists(row["png"]):
+            raise OSError(f"PyMOL did not write {row['png']}")
+    except Exception as e:
+        row.update(status="failed", error=f"{type(e).__name__}: {e}")
+    row["seconds"] = round(time.perf_counter() - start, 2)
+    return row
+
+def read_manifest(manifest, out_dir, default_command):
+    """Summary rows (without results) for every figure in the manifest."""
+    rows = []
+    with open(manifest, newline="") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None or "structure" not in reader.fieldnames:
+            raise ValueError(f"{manifest} has no structure column")
+        for number, line in enumerate(reader, 2):
+            command = (line.get("command") or default_command).strip()
+            if command not in ("complexfig", "outline", "electropot"):
+                raise ValueError(f"{manifest} line {number}: unknown command '{command}'")
+            chains = (line.get("chains") or "").strip()
+            if command == "complexfig" and not chains:
+                raise ValueError(f"{manifest} line {number}: complexfig needs chains")
+            png = line.get("png") or f"{object_name(line['structure'])}_{command}.png"
+            rows.append({"structure": line["structure"].strip(), "command": command, "chains": chains,
+                         "png": os.path.join(out_dir, png)})
+    return rows
+
+def render_all(rows, width, height, dpi, workers=1, summary=None):
+    """Render every row in a pool of PyMOL workers, writing summary rows as figures finish."""
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    jobs = [(row, width, height, dpi) for row in rows]
+    results = []
+    with ProcessPoolExecutor(workers, initializer=_start_pymol, initargs=(threads,)) as pool:
+        writer = None
+        if summary is not None:
+            writer = csv.DictWriter(summary, fieldnames=SUMMARY_COLUMNS)
+            writer.writeheader()
+        for row in pool.map(render, jobs):
+            results.append(row)
+            if writer is not None:
+                writer.writerow(row)
+                summary.flush()
+            print(f"{row['png']}: {row['status']} in {row['seconds']}s" + (f" ({row['error']})" if row["error"] else ""))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render PyMOL figures for many structures in parallel, headless.")
+    parser.add_argument("manifest", help="CSV with structure and optionally command, chains and png columns")
+    parser.add_argument("--out-dir", default="figures", help="where to write the PNGs and summary.csv (default figures)")
+    parser.add_argument("--command", default="complexfig", help="command for rows without one (default complexfig)")
+    parser.add_argument("--workers", type=int, default=2, help="PyMOL processes (default 2)")
+    parser.add_argument("--width", type=int, default=2400, help="image width in pixels (default 2400)")
+    parser.add_argument("--height", type=int, default=1800, help="image height in pixels (default 1800)")
+    parser.add_argument("--dpi", type=int, default=300, help="image DPI (default 300)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.manifest):
+        print(f"Error: File '{args.manifest}' not found.")
+        sys.exit(1)
+
+    try:
+        rows = read_manifest(args.manifest, args.out_dir, args.command)
+        os.makedirs(args.out_dir, exist_ok=True)
+        with open(os.path.join(args.out_dir, "summary.csv"), "w", newline="") as summary:
+            results = render_all(rows, args.width, args.height, args.dpi, args.workers, summary)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    except BrokenProcessPool as e:
+        # A worker that couldn't import PyMOL or the figure scripts, or crashed
+        print(f"Error: a PyMOL worker failed to start or died, check PyMOL runs headless here ({e})")
+        sys.exit(1)
+
+    failed = sum(1 for row in results if row["status"] != "ok")
+    print(f"\n{len(results) - failed} figures made, {failed} failed, see {os.path.join(args.out_dir, 'summary.csv')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The scripts import each other by module name from their own folders
+for folder in ("protparam", "alphafold", "pymol"):
+    sys.path.insert(0, os.path.join(ROOT, folder))
@@ -0,0 +1,45 @@
+import csv
+import json
+
+import af3index
+
+
+def write_job(output_dir, folder, name, sequence):
+    """A job folder as AlphaFold3 leaves it, with just its _data.json."""
+    job_dir = output_dir / folder
+    job_dir.mkdir(parents=True)
+    data = {"name": name, "sequences": [{"protein": {"id": "A", "sequence": sequence}}]}
+    (job_dir / f"{folder}_data.json").write_text(json.dumps(data))
+    return job_dir
+
+
+def write_input(path, name):
+    path.write_text(json.dumps({"name": name, "sequences": []}))
+    return str(path)
+
+
+def test_job_folders_only_finds_the_given_jobs(tmp_path):
+    outputs = tmp_path / "out"
+    write_job(outputs, "heavy_light", "Heavy Light", "QVQL")
+    write_job(outputs, "heavy_light_20260101_120000", "Heavy Light", "QVQL")
+    write_job(outputs, "heavy_light_2", "Heavy Light 2", "EVQL")
+    write_job(outputs, "other", "other", "DIQM")
+    inputs = [write_input(tmp_path / "a.json", "Heavy Light"), write_input(tmp_path / "b.json", "never_run")]
+
+    assert af3index.job_folders(str(outputs), inputs) == [str(outputs / "heavy_light_20260101_120000")]
+
+
+def test_add_inputs_and_append(tmp_path):
+    outputs = tmp_path / "out"
+    write_job(outputs, "one", "one", "QVQL")
+    write_job(outputs, "two", "two", "EVQL")
+    index = tmp_path / "index.csv"
+
+    af3index.main(["--index", str(index), "add", str(outputs), "--inputs", write_input(tmp_path / "one.json", "one")])
+    af3index.main(["--index", str(index), "add", str(outputs), "--inputs", write_input(tmp_path / "two.json", "two")])
+    af3index.main(["--index", str(index), "add", str(outputs)])
+
+    with open(index, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == af3index.INDEX_COLUMNS
+    assert [row[1] for row in rows[1:]] == ["one", "two"]
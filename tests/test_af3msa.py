@@ -0,0 +1,43 @@
+import json
+
+import af3msa
+from af3msa import MsaCache
+
+MSAS = {"unpairedMsa": ">query\nQVQL\n", "pairedMsa": "", "templates": []}
+
+
+def protein(sequence, **fields):
+    return {"protein": {"id": "A", "sequence": sequence, **fields}}
+
+
+def test_store_then_fill(tmp_path):
+    cache = MsaCache(str(tmp_path / "cache"))
+    assert cache.store(protein("QVQL", **MSAS))
+    # Already cached, and entries without their MSAs or ligands aren't stored
+    assert not cache.store(protein("qvql", **MSAS))
+    assert not cache.store(protein("EVQL", unpairedMsa=">q\nEVQL\n"))
+    assert not cache.store({"ligand": {"id": "L", "ccdCodes": ["ATP"]}})
+    assert [p.suffix for p in (tmp_path / "cache").iterdir()] == [".json"]
+
+    entity = protein("QVQL")
+    assert cache.fill(entity)
+    assert entity["protein"] == {"id": "A", "sequence": "QVQL", **MSAS}
+    # Not cached, or MSAs given already
+    assert not cache.fill(protein("EVQL"))
+    assert not cache.fill(protein("QVQL", unpairedMsa=""))
+    assert cache.hits == 1
+
+
+def test_add_inputs(tmp_path):
+    outputs = tmp_path / "out"
+    for name, sequence in [("one", "QVQL"), ("two", "EVQL")]:
+        (outputs / name).mkdir(parents=True)
+        data = {"name": name, "sequences": [protein(sequence, **MSAS)]}
+        (outputs / name / f"{name}_data.json").write_text(json.dumps(data))
+    (tmp_path / "one.json").write_text(json.dumps({"name": "one", "sequences": []}))
+
+    cache_dir = tmp_path / "cache"
+    af3msa.main(["--cache", str(cache_dir), "add", str(outputs), "--inputs", str(tmp_path / "one.json")])
+    cache = MsaCache(str(cache_dir))
+    assert cache.fill(protein("QVQL"))
+    assert not cache.fill(protein("EVQL"))
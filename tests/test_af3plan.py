@@ -0,0 +1,56 @@
+import af3plan
+from af3plan import STARTUP_MINUTES, TIME_MARGIN, entity_tokens, job_minutes, plan_jobs, smiles_atoms, write_plan
+
+
+def test_entity_tokens():
+    assert entity_tokens({"protein": {"id": ["A", "B"], "sequence": "QVQLVESGG"}}) == 18
+    assert entity_tokens({"protein": {"id": "A", "sequence": "QVQL",
+                                      "modifications": [{"ptmType": "SEP", "ptmPosition": 2}]}}) == 4 + 9
+    assert entity_tokens({"ligand": {"id": "L", "ccdCodes": ["ATP", "MG", "XYZ"]}}) == 31 + 1 + 25
+    assert entity_tokens({"ligand": {"id": ["L", "M"], "smiles": "CC(=O)O"}}) == 8
+
+
+def test_smiles_atoms_skips_hydrogens():
+    assert smiles_atoms("[2H]C(Cl)=O") == 3
+    assert smiles_atoms("[Hg]Br") == 2
+    assert smiles_atoms("c1ccccc1[NH3+]") == 7
+
+
+def test_job_minutes_charges_startup_per_job():
+    assert job_minutes(0, seeds=1) == STARTUP_MINUTES + 20 / 60
+    assert job_minutes(1024, entities=2, cached_msas=1) == STARTUP_MINUTES + 10 + 7 * 62 / 60
+
+
+def test_plan_jobs_fits_time_limit():
+    jobs = [{"job": f"small{i}", "json": f"small{i}.json", "tokens": "300"} for i in range(200)]
+    jobs.append({"job": "big", "json": "big.json", "tokens": "6000", "entities": "3"})
+    plan = plan_jobs(jobs, time_limit=4)
+
+    assert set(plan) == {"small", "huge"}
+    assert [[row["job"] for row in task] for task in plan["huge"]] == [["big"]]
+    assert sorted(row["job"] for task in plan["small"] for row in task) == sorted(f"small{i}" for i in range(200))
+    for task in plan["small"]:
+        assert sum(row["minutes"] for row in task) <= 4 * 60 / TIME_MARGIN
+    # First-fit packs every task but the last full
+    per_task = int(4 * 60 / TIME_MARGIN // plan["small"][0][0]["minutes"])
+    assert [len(task) for task in plan["small"][:-1]] == [per_task] * (len(plan["small"]) - 1)
+
+    plan = plan_jobs(jobs[:10], time_limit=4, max_jobs=3)
+    assert [len(task) for task in plan["small"]] == [3, 3, 3, 1]
+
+
+def test_write_plan_removes_stale_tasks(tmp_path):
+    jsons = []
+    for i in range(4):
+        path = tmp_path / f"job{i}.json"
+        path.write_text("{}")
+        jsons.append({"job": f"job{i}", "json": str(path), "tokens": "300"})
+    out = tmp_path / "plan"
+    write_plan(plan_jobs(jsons, max_jobs=1), str(out))
+    assert sorted(p.name for p in (out / "small").iterdir()) == ["task_0", "task_1", "task_2", "task_3"]
+
+    write_plan(plan_jobs(jsons[:2], max_jobs=1), str(out))
+    assert sorted(p.name for p in (out / "small").iterdir()) == ["task_0", "task_1"]
+    linked = sorted(link.name for task in (out / "small").iterdir() for link in task.iterdir())
+    assert linked == ["job0.json", "job1.json"]
+    assert len(af3plan.read_jobs([str(out / "plan.csv")])) == 2
@@ -0,0 +1,119 @@
+import csv
+import sys
+
+import pytest
+
+import batchfig
+
+# Just enough of PyMOL for the figure scripts, png only writes a file
+STUB_CMD = '''
+def _ignore(*args, **kwargs):
+    pass
+
+def __getattr__(name):
+    return _ignore
+
+_objects = []
+settings = {}
+
+def reinitialize():
+    _objects.clear()
+    settings.clear()
+
+def set(name, value, selection=""):
+    settings[name] = value
+
+def load(path, name):
+    if "bad" in path:
+        raise RuntimeError("Invalid file")
+    _objects.append(name)
+
+def get_object_list(selection="all"):
+    return [name for name in _objects if selection in ("all", name)]
+
+def get_chains(obj):
+    return ["A", "B"]
+
+def png(filename, width=0, height=0, dpi=-1, ray=0):
+    if "skip" not in filename:
+        with open(filename, "w") as f:
+            f.write(f"{width}x{height}@{dpi}")
+'''
+
+
+@pytest.fixture
+def stub_pymol(tmp_path, monkeypatch):
+    """Put a fake pymol package first on the path, for the worker processes too."""
+    package = tmp_path / "stub" / "pymol"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "util.py").write_text("def __getattr__(name):\n    return lambda *args, **kwargs: None\n")
+    (package / "cmd.py").write_text(STUB_CMD)
+    monkeypatch.syspath_prepend(str(tmp_path / "stub"))
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path / "stub"))
+    return package
+
+
+def write_manifest(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["structure", "command", "chains", "png"])
+        writer.writerows(rows)
+
+
+def test_render_all_with_stub(tmp_path, stub_pymol):
+    for name in ["one", "two", "bad", "skip"]:
+        (tmp_path / f"{name}.pdb").write_text("")
+    manifest = tmp_path / "figures.csv"
+    write_manifest(manifest, [
+        [tmp_path / "one.pdb", "complexfig", "A", ""],
+        [tmp_path / "two.pdb", "outline", "", ""],
+        [tmp_path / "bad.pdb", "electropot", "", ""],
+        [tmp_path / "skip.pdb", "outline", "", "skip.png"],
+    ])
+    out = tmp_path / "figures"
+    out.mkdir()
+    # Left by an earlier run, must not count as this run's figure
+    (out / "skip.png").write_text("old")
+
+    batchfig.main([str(manifest), "--out-dir", str(out), "--workers", "2", "--width", "20", "--height", "10", "--dpi", "72"])
+
+    with open(out / "summary.csv", newline="") as f:
+        summary = {row["structure"].rsplit("/", 1)[-1]: row for row in csv.DictReader(f)}
+    assert {name: row["status"] for name, row in summary.items()} == {
+        "one.pdb": "ok", "two.pdb": "ok", "bad.pdb": "failed", "skip.pdb": "failed"}
+    assert "Invalid file" in summary["bad.pdb"]["error"]
+    assert "did not write" in summary["skip.pdb"]["error"]
+    assert not (out / "skip.png").exists()
+    assert (out / "one_complexfig.png").read_text() == "20x10@72"
+
+
+def test_thread_share_survives_reinitialize(tmp_path, stub_pymol, monkeypatch):
+    # Render in this process, putting back what _start_pymol sets afterwards
+    for name in ["cmd", "COMMANDS", "THREADS"]:
+        monkeypatch.setattr(batchfig, name, getattr(batchfig, name))
+    modules = dict(sys.modules)
+    try:
+        batchfig._start_pymol(3)
+        (tmp_path / "one.pdb").write_text("")
+        for number in range(2):
+            row = {"structure": str(tmp_path / "one.pdb"), "command": "outline", "chains": "",
+                   "png": str(tmp_path / f"one_{number}.png")}
+            assert batchfig.render((row, 20, 10, 72))["status"] == "ok"
+            assert batchfig.cmd.settings["max_threads"] == 3
+    finally:
+        # Later tests' workers are forked from this process and must import their own stub
+        for name in set(sys.modules) - set(modules):
+            del sys.modules[name]
+
+
+def test_worker_start_failure(tmp_path, stub_pymol, capsys):
+    (stub_pymol / "cmd.py").write_text("raise ImportError('no display')\n")
+    (tmp_path / "one.pdb").write_text("")
+    manifest = tmp_path / "figures.csv"
+    write_manifest(manifest, [[tmp_path / "one.pdb", "outline", "", ""]])
+
+    with pytest.raises(SystemExit) as exit:
+        batchfig.main([str(manifest), "--out-dir", str(tmp_path / "figures"), "--workers", "1"])
+    assert exit.value.code == 1
+    assert capsys.readouterr().out.startswith("Error: a PyMOL worker failed to start")
@@ -0,0 +1,113 @@
+import csv
+import random
+
+import pytest
+
+import csvprot
+from protbatch import AA_ORDER
+from protmotifs import MotifScanner
+
+OPTIONS = ["--charge-at", "7.4", "--liabilities"]
+
+
+def write_library(path, n, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["clone", "VHH"])
+        for i in range(n):
+            writer.writerow([f"c{i}", "".join(rng.choices(AA_ORDER, k=rng.randint(100, 130)))])
+
+
+def append_rows(path, n, seed=1):
+    rng = random.Random(seed)
+    with open(path, "a", newline="") as f:
+        writer = csv.writer(f)
+        for i in range(n):
+            writer.writerow([f"new{i}", "".join(rng.choices(AA_ORDER, k=rng.randint(100, 130)))])
+
+
+@pytest.fixture
+def calculated(monkeypatch):
+    """Count the sequences sent to each calculation."""
+    counts = {"metrics": 0, "charge": 0, "liabilities": 0}
+    timed_metric_rows, charge_rows, rows = csvprot.timed_metric_rows, csvprot.charge_rows, MotifScanner.rows
+
+    def count(name, func):
+        def counted(*args, **kwargs):
+            seqs = args[1] if name == "liabilities" else args[0]
+            counts[name] += len(seqs)
+            return func(*args, **kwargs)
+        return counted
+
+    monkeypatch.setattr(csvprot, "timed_metric_rows", count("metrics", timed_metric_rows))
+    monkeypatch.setattr(csvprot, "charge_rows", count("charge", charge_rows))
+    monkeypatch.setattr(MotifScanner, "rows", count("liabilities", rows))
+    return counts
+
+
+def test_incremental_append_only_calculates_new_rows(tmp_path, calculated):
+    library = tmp_path / "lib.csv"
+    write_library(library, 3000)
+    csvprot.main([str(library)] + OPTIONS)
+    append_rows(library, 30)
+    for name in calculated:
+        calculated[name] = 0
+
+    csvprot.main([str(library), "--incremental"] + OPTIONS)
+    incremental = (tmp_path / "lib_protparam.csv").read_bytes()
+    assert calculated == {"metrics": 30, "charge": 30, "liabilities": 30}
+
+    csvprot.main([str(library)] + OPTIONS)
+    assert (tmp_path / "lib_protparam.csv").read_bytes() == incremental
+
+
+def test_incremental_only_calculates_missing_columns(tmp_path, calculated):
+    library = tmp_path / "lib.csv"
+    write_library(library, 2000)
+    csvprot.main([str(library)])
+    for name in calculated:
+        calculated[name] = 0
+
+    # Metrics are reused, the charge and liability columns are new to every row
+    csvprot.main([str(library), "--incremental"] + OPTIONS)
+    incremental = (tmp_path / "lib_protparam.csv").read_bytes()
+    assert calculated == {"metrics": 0, "charge": 2000, "liabilities": 2000}
+
+    csvprot.main([str(library)] + OPTIONS)
+    assert (tmp_path / "lib_protparam.csv").read_bytes() == incremental
+
+
+def test_incremental_recalculates_changed_rows(tmp_path, calculated):
+    library = tmp_path / "lib.csv"
+    write_library(library, 500)
+    csvprot.main([str(library)])
+    rows = library.read_text().splitlines()
+    rows[10] = "c9,ACDEFGHIKLMNPQRSTVWY"
+    library.write_text("\n".join(rows) + "\n")
+    calculated["metrics"] = 0
+
+    csvprot.main([str(library), "--incremental"])
+    incremental = (tmp_path / "lib_protparam.csv").read_bytes()
+    assert calculated["metrics"] == 1
+    csvprot.main([str(library)])
+    assert (tmp_path / "lib_protparam.csv").read_bytes() == incremental
+
+
+def test_incremental_reuses_quoted_rows(tmp_path, calculated):
+    library = tmp_path / "lib.csv"
+    with open(library, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["clone", "VHH"])
+        writer.writerow(["c1, lot 2", "QVQLVESGGGLVQAGGSLRLSCAASG"])
+        writer.writerow(['c2 "tall"', "EVQLVESGGGLVQPGGSLRLSCAASG"])
+        writer.writerow(["c3\nsplit", "QVKLEESGGGSVQTGGSLRLTCAASG"])
+    csvprot.main([str(library)])
+    append_rows(library, 2)
+    calculated["metrics"] = 0
+
+    csvprot.main([str(library), "--incremental"])
+    incremental = (tmp_path / "lib_protparam.csv").read_bytes()
+    assert calculated["metrics"] == 2
+    csvprot.main([str(library)])
+    assert (tmp_path / "lib_protparam.csv").read_bytes() == incremental
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+import fasta2json
+
+GOOD = ">heavy#2\nEVQLVESGGGLVQ\n>light\nDIQMTQSPSS\n"
+# Fails on the ligand after the heavy chain has already been written
+BAD = ">heavy\nEVQLVESGGGLVQ\n>lig#2&1_C1_2_O2\nATP\n"
+
+
+def test_fasta_to_json(tmp_path):
+    fasta = tmp_path / "job.fasta"
+    fasta.write_text(GOOD)
+    fasta2json.fasta_to_json(str(fasta))
+    data = json.loads((tmp_path / "job.json").read_text())
+    assert [entity["protein"]["id"] for entity in data["sequences"]] == [["A", "B"], ["C"]]
+
+
+def test_failed_conversion_leaves_no_json(tmp_path):
+    fasta = tmp_path / "job.fasta"
+    fasta.write_text(BAD)
+    with pytest.raises(ValueError):
+        fasta2json.fasta_to_json(str(fasta))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["job.fasta"]
+
+    # An earlier good JSON is kept as it was
+    (tmp_path / "job.json").write_text("{}")
+    with pytest.raises(ValueError):
+        fasta2json.fasta_to_json(str(fasta))
+    assert (tmp_path / "job.json").read_text() == "{}"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["job.fasta", "job.json"]
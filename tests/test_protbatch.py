@@ -0,0 +1,100 @@
+import os
+import sys
+import csv
+import random
+import subprocess
+
+import pytest
+
+import protbatch
+from protbatch import metric_rows
+from protlib import (molecular_weight, calculate_pI, extinction_coefficient, instability_index,
+                     aliphatic_index, half_life)
+from conftest import ROOT
+
+np = pytest.importorskip("numpy")
+
+
+def random_seqs(n, seed=0):
+    rng = random.Random(seed)
+    # Include the 1 and 2 residue edge cases next to antibody-sized ones
+    lengths = [1, 2, 3] + [rng.randint(1, 600) for _ in range(n - 3)]
+    return ["".join(rng.choices(protbatch.AA_ORDER, k=length)) for length in lengths]
+
+
+def per_sequence_rows(seqs):
+    return [[len(seq), round(molecular_weight(seq), 2), calculate_pI(seq), round(extinction_coefficient(seq), 3),
+             round(instability_index(seq), 2), round(aliphatic_index(seq), 2), half_life(seq)] for seq in seqs]
+
+
+def plain_sum(values):
+    total = 0.0
+    for x in values:
+        total += x
+    return total
+
+
+def neumaier_sum(values):
+    # What sum() of floats does from Python 3.12 on
+    total = comp = 0.0
+    for x in values:
+        t = total + x
+        comp += (total - t) + x if abs(total) >= abs(x) else (x - t) + total
+        total = t
+    return total + comp
+
+
+def test_metric_rows_match_per_sequence_functions():
+    seqs = random_seqs(2000)
+    assert metric_rows(seqs) == per_sequence_rows(seqs)
+
+
+def test_unrounded_metrics_are_bit_identical():
+    seqs = random_seqs(1000, seed=1)
+    m = protbatch.batch_metrics(seqs)
+    assert m["MW"].tolist() == [molecular_weight(seq) for seq in seqs]
+    assert m["Extinction"].tolist() == [extinction_coefficient(seq) for seq in seqs]
+    assert m["Instability"].tolist() == [instability_index(seq) for seq in seqs]
+    assert m["Aliphatic"].tolist() == [aliphatic_index(seq) for seq in seqs]
+
+
+def test_fallback_without_numpy_matches(monkeypatch):
+    seqs = random_seqs(300, seed=2)
+    expected = metric_rows(seqs)
+    monkeypatch.setattr(protbatch, "np", None)
+    assert metric_rows(seqs) == expected
+
+
+@pytest.mark.parametrize("compensated", [False, True])
+def test_ordered_sum_matches_python_summation(compensated):
+    rng = random.Random(3)
+    # Widely different magnitudes so compensation actually changes the result
+    rows = [[rng.choice([1e16, 1.0, -1e16, 0.1, 3e-8]) * rng.random() for _ in range(rng.randint(0, 50))]
+            for _ in range(500)]
+    values = np.array([x for row in rows for x in row])
+    lengths = np.array([len(row) for row in rows])
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    result = protbatch.ordered_sum(values, offsets, lengths, compensated).tolist()
+    reference = neumaier_sum if compensated else plain_sum
+    assert result == [reference(row) for row in rows]
+    if compensated and sys.version_info >= (3, 12):
+        assert result == [sum(row, 0.0) for row in rows]
+
+
+def test_jobs_output_matches_single_process_and_per_sequence(tmp_path):
+    seqs = random_seqs(9000, seed=4)
+    fasta = tmp_path / "lib.fasta"
+    fasta.write_text("".join(f">s{i}\n{seq}\n" for i, seq in enumerate(seqs)))
+
+    outputs = []
+    for jobs in ("1", "3"):
+        subprocess.run([sys.executable, os.path.join(ROOT, "protparam", "fastaprot.py"), str(fasta), "--jobs", jobs],
+                       cwd=tmp_path, check=True, stdout=subprocess.DEVNULL)
+        outputs.append((tmp_path / "lib_protparam.csv").read_bytes())
+    assert outputs[0] == outputs[1]
+
+    with open(tmp_path / "lib_protparam.csv", newline="") as f:
+        rows = list(csv.reader(f))[1:]
+    expected = per_sequence_rows(seqs)
+    assert [row[-7:] for row in rows] == [[str(value) for value in row] for row in expected]
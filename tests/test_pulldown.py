@@ -0,0 +1,16 @@
+import pulldown
+
+
+def test_rewriting_a_screen_clears_old_jobs(tmp_path):
+    baits, preys = tmp_path / "baits.fasta", tmp_path / "preys.fasta"
+    baits.write_text(">ag0\nMKTAYIAKQR\n")
+    preys.write_text(">nb0\nQVQLVESGGG\n>nb1\nEVQLVESGGG\n>nb2\nDVQLQESGGG\n")
+    out = tmp_path / "screen"
+    rows = pulldown.write_screen(str(baits), str(preys), str(out), 3)
+    assert sorted(p.name for p in out.iterdir()) == ["index.csv", "task_0", "task_1", "task_2"]
+
+    # ag0_nb0 was predicted since, and the screen is rewritten as one task
+    predicted = {rows[0]["hash"]: "AF3Outputs/ag0_nb0"}
+    pulldown.write_screen(str(baits), str(preys), str(out), 1, predicted, skip_existing=True)
+    assert sorted(p.name for p in out.iterdir()) == ["index.csv", "task_0"]
+    assert sorted(p.name for p in (out / "task_0").iterdir()) == ["ag0_nb1.json", "ag0_nb2.json"]